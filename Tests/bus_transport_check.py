@@ -0,0 +1,270 @@
+# Checks bus.RoboclawBus and the roboclaw_3 transport against the pty
+# simulator (roboclaw_sim.py):
+# - queued requests run highest priority class first
+# - a newer set-point for the same motor replaces a queued one, and the
+#   caller of the old one gets the new one's result
+# - an ESTOP purges queued set-points for its address, and runs while
+#   another thread holds the bus in batch()
+# - a request still queued after its deadline returns False
+# - WritePipelined only reports an ACK for a frame when it can't belong to
+#   a later frame, and resends the rest
+# - TransportPolicy timeouts follow the measured round trips and retries
+#   back off, including on a link that loses bytes, and Roboclaw won't take
+#   a timeout or retries next to a policy that would override them
+# Exits 1 on the first failure.
+# Run from the repo root: python Tests/bus_transport_check.py
+
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from bus import DRIVE, ESTOP, SHOOTER, TELEMETRY, RoboclawBus  # noqa: E402
+from checks import run_checks  # noqa: E402
+from roboclaw_3 import Roboclaw, TransportPolicy, _confirmed  # noqa: E402
+from roboclaw_sim import RoboclawSimulator  # noqa: E402
+
+DRIVE_ADDRESS = 0x80
+SHOOTER_ADDRESS = 0x82
+BAUD = 38400
+
+
+def open_bus(sim, pipeline=1):
+    bus = RoboclawBus(sim.port, BAUD, pipeline=pipeline)
+    assert bus.open(), f"Could not open {sim.port}"
+    return bus
+
+
+def record_calls(bus, names):
+    # Wraps Roboclaw.<name> on the bus's driver to log (name, address) in
+    # the order the bus thread runs them
+    calls = []
+    for name in names:
+        method = getattr(bus.roboclaw, name)
+
+        def wrapper(address, *args, name=name, method=method):
+            calls.append((name, address))
+            return method(address, *args)
+        setattr(bus.roboclaw, name, wrapper)
+    return calls
+
+
+def wait_for(condition, timeout=2.0):
+    end = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < end, "timed out"
+        time.sleep(0.001)
+
+
+def call_in_thread(function, *args):
+    # Runs a blocking handle call in the background, results[0] is its
+    # return value once the thread is done
+    results = []
+    thread = threading.Thread(target=lambda: results.append(function(*args)))
+    thread.start()
+    return thread, results
+
+
+def check_priority_order():
+    with RoboclawSimulator(baud=BAUD) as sim:
+        bus = open_bus(sim)
+        calls = record_calls(bus, ('ReadEncM1', 'ForwardM2', 'ForwardM1',
+                                   'DutyM1M2'))
+        telemetry = bus.handle(DRIVE_ADDRESS, TELEMETRY, wait=False)
+        shooter = bus.handle(SHOOTER_ADDRESS, SHOOTER, wait=False)
+        estop = bus.handle(DRIVE_ADDRESS, ESTOP, wait=False)
+        drive = bus.handle(DRIVE_ADDRESS, DRIVE)
+        # Queued lowest priority first, nothing starts until the drive
+        # call waits
+        with bus.batch():
+            telemetry.ReadEncM1()
+            shooter.ForwardM2(20)
+            estop.ForwardM1(0)
+            assert drive.DutyM1M2(1000, 1000) is True
+        wait_for(lambda: len(calls) == 4)
+        assert [name for name, address in calls] == [
+            'ForwardM1', 'DutyM1M2', 'ForwardM2', 'ReadEncM1'], calls
+
+
+def check_coalescing():
+    with RoboclawSimulator(baud=BAUD) as sim:
+        bus = open_bus(sim)
+        calls = record_calls(bus, ('DutyM1M2', 'DutyM1'))
+        drive = bus.handle(DRIVE_ADDRESS, DRIVE)
+        with bus.batch():
+            first, first_result = call_in_thread(drive.DutyM1M2, 8000, 8000)
+            wait_for(lambda: len(bus._queues[DRIVE]) == 1)
+            second, second_result = call_in_thread(drive.DutyM1M2, 16000, 16000)
+            wait_for(lambda: bus.stats()['drive']['coalesced'] == 1)
+            # Another motor is its own set-point
+            assert drive.DutyM1(4000) is True
+        first.join()
+        second.join()
+        assert first_result == [True] and second_result == [True]
+        assert calls.count(('DutyM1M2', DRIVE_ADDRESS)) == 1, calls
+        assert calls.count(('DutyM1', DRIVE_ADDRESS)) == 1, calls
+        stats = bus.stats()['drive']
+        assert stats['count'] == 2 and stats['coalesced'] == 1, stats
+        m2 = sim.devices[DRIVE_ADDRESS].m2
+        assert m2.target == 16000 / 32767 * m2.max_speed, m2.target
+
+
+def check_estop_purge():
+    with RoboclawSimulator(baud=BAUD) as sim:
+        bus = open_bus(sim)
+        drive = bus.handle(DRIVE_ADDRESS, DRIVE)
+        shooter = bus.handle(SHOOTER_ADDRESS, SHOOTER)
+        estop = bus.handle(DRIVE_ADDRESS, ESTOP)
+        with bus.batch():
+            moving, moving_result = call_in_thread(drive.DutyM1M2, 8000, 8000)
+            other, other_result = call_in_thread(shooter.ForwardM1, 64)
+            wait_for(lambda: bus._queues[DRIVE] and bus._queues[SHOOTER])
+            assert estop.ForwardM1(0) is True
+        moving.join()
+        other.join()
+        # The drive set-point never ran, the other address's one did
+        assert moving_result == [False], moving_result
+        assert other_result == [True], other_result
+        assert sim.devices[DRIVE_ADDRESS].m2.target == 0
+        assert sim.devices[SHOOTER_ADDRESS].m1.target > 0
+
+
+def check_estop_during_batch():
+    with RoboclawSimulator(baud=BAUD) as sim:
+        bus = open_bus(sim, pipeline=2)
+        drive = bus.handle(DRIVE_ADDRESS, DRIVE, wait=False)
+        estop = bus.handle(SHOOTER_ADDRESS, ESTOP)
+        with bus.batch():
+            held = drive.DutyM1M2(8000, 8000)
+            # From another thread, while this one still holds the batch
+            stop, stop_result = call_in_thread(estop.ForwardM1, 0)
+            stop.join(1.0)
+            assert stop_result == [True], stop_result
+            assert held.poll() is None  # Not pipelined with the stop
+        wait_for(lambda: held.poll() is not None)
+        assert held.poll() is True
+
+
+def check_deadline():
+    with RoboclawSimulator(baud=BAUD) as sim:
+        bus = open_bus(sim)
+        drive = bus.handle(DRIVE_ADDRESS, DRIVE, deadline=0.01)
+        with bus.batch():
+            late, late_result = call_in_thread(drive.DutyM1M2, 8000, 8000)
+            wait_for(lambda: len(bus._queues[DRIVE]) == 1)
+            time.sleep(0.03)
+        late.join()
+        assert late_result == [False], late_result
+        stats = bus.stats()['drive']
+        assert stats['expired'] == 1 and stats['count'] == 0, stats
+        # In time, it runs
+        assert drive.DutyM1M2(8000, 8000) is True
+
+
+def check_ack_matching():
+    # Two 6 byte frames at 38400 baud end 1.56 ms and 3.12 ms after start
+    packets = [bytes(6), bytes(6)]
+    assert _confirmed(packets, 0.0, [0.002, 0.004], BAUD) == 2
+    # One ACK before the second frame was out can only be the first's
+    assert _confirmed(packets, 0.0, [0.002], BAUD) == 1
+    # One ACK after it could be either, neither is confirmed
+    assert _confirmed(packets, 0.0, [0.004], BAUD) == 0
+    assert _confirmed(packets, 0.0, [], BAUD) == 0
+
+
+def corrupt(packet):
+    # Same frame with a bad CRC, the board stays silent
+    return packet[:-1] + bytes((packet[-1] ^ 0xFF,))
+
+
+def check_pipelined_missing_acks():
+    with RoboclawSimulator(baud=BAUD) as sim:
+        roboclaw = Roboclaw(sim.port, BAUD)
+        assert roboclaw.Open(), f"Could not open {sim.port}"
+        drive = roboclaw.Frame('ForwardM1', DRIVE_ADDRESS, 32)
+        shooter = roboclaw.Frame('ForwardM1', SHOOTER_ADDRESS, 64)
+        assert roboclaw.WritePipelined([drive, shooter]) == [True, True]
+        # Whichever frame goes unanswered, only the other reports success
+        assert roboclaw.WritePipelined([drive, corrupt(shooter)]) == [True, False]
+        assert roboclaw.WritePipelined([corrupt(drive), shooter]) == [False, True]
+    # A lost frame or ACK is recovered by resending the frame
+    with RoboclawSimulator(baud=BAUD, drop_rate=0.03, seed=1) as sim:
+        roboclaw = Roboclaw(sim.port, BAUD)
+        assert roboclaw.Open(), f"Could not open {sim.port}"
+        results = [roboclaw.WritePipelined([drive, shooter]) for _ in range(50)]
+        assert sim.dropped_packets > 0 and sim.dropped_bytes > 0
+        # Only a frame lost on every try may fail, ~1 in 200
+        failed = sum(result.count(False) for result in results)
+        assert failed <= 3, results
+
+
+def check_policy():
+    policy = TransportPolicy(timeout=0.01, min_timeout=0.002,
+                             max_timeout=0.05, factor=3.0, window=64,
+                             backoff=0.001, max_backoff=0.008)
+    assert policy.timeout(DRIVE_ADDRESS) == 0.01
+    for _ in range(16):
+        policy.record(DRIVE_ADDRESS, 0.001)
+    assert abs(policy.timeout(DRIVE_ADDRESS) - 0.003) < 1e-9
+    # Clamped at both ends, other addresses untouched
+    for _ in range(64):
+        policy.record(DRIVE_ADDRESS, 0.0001)
+    assert policy.timeout(DRIVE_ADDRESS) == 0.002
+    for _ in range(64):
+        policy.record(DRIVE_ADDRESS, 0.1)
+    assert policy.timeout(DRIVE_ADDRESS) == 0.05
+    assert policy.timeout(SHOOTER_ADDRESS) == 0.01
+
+    delays = [policy.retry(SHOOTER_ADDRESS) for _ in range(5)]
+    assert delays == [0.001, 0.002, 0.004, 0.008, 0.008], delays
+    policy.record(SHOOTER_ADDRESS, 0.001)
+    assert policy.retry(SHOOTER_ADDRESS) == 0.001
+    policy.timed_out(SHOOTER_ADDRESS)
+    stats = policy.stats()[SHOOTER_ADDRESS]
+    assert stats['retries'] == 6 and stats['timeouts'] == 1, stats
+
+    # The driver's timeout and retries build its policy, and can't be
+    # given alongside one
+    roboclaw = Roboclaw('/dev/null', BAUD, timeout=0.05, retries=5)
+    assert roboclaw.policy.initial_timeout == 0.05
+    assert roboclaw.policy.retries == 5 and roboclaw._trystimeout == 5
+    assert Roboclaw('/dev/null', BAUD, policy=policy).timeout == 0.01
+    try:
+        Roboclaw('/dev/null', BAUD, timeout=0.05, policy=policy)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("timeout was accepted with policy")
+
+
+def check_lossy_link():
+    # Bytes lost both ways and corrupted frames, ~20% of tries fail
+    with RoboclawSimulator(baud=BAUD, drop_rate=0.03, corrupt_rate=0.03,
+                           seed=1) as sim:
+        roboclaw = Roboclaw(sim.port, BAUD)
+        assert roboclaw.Open(), f"Could not open {sim.port}"
+        results = [roboclaw.ForwardM1(DRIVE_ADDRESS, n % 128)
+                   for n in range(200)]
+        stats = roboclaw.policy.stats()[DRIVE_ADDRESS]
+        assert sim.dropped_packets and sim.dropped_bytes and sim.crc_errors
+        # ~1 in 120 writes fails all 3 tries
+        assert results.count(False) <= 5, results.count(False)
+        assert stats['retries'] > 0 and stats['timeouts'] > 0, stats
+        # Set from the measured round trips, no longer the 10 ms default.
+        # How far it moves depends on scheduling jitter on this machine
+        assert stats['timeout_ms'] != 10.0, stats
+        print(f"     {sim.dropped_packets} requests and {sim.dropped_bytes} "
+              f"ACKs lost, {sim.crc_errors} CRC errors, {stats['retries']} "
+              f"retries, timeout {stats['timeout_ms']:.2f} ms")
+
+
+def main():
+    checks = [check_priority_order, check_coalescing, check_estop_purge,
+              check_estop_during_batch, check_deadline, check_ack_matching,
+              check_pipelined_missing_acks, check_policy, check_lossy_link]
+    return run_checks(checks)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,17 @@
+# The main loop shared by the Tests/*_check.py scripts: runs the checks in
+# order, printing ok or FAIL with each one's name, and stops at the first
+# failed assertion
+
+
+def run_checks(checks):
+    # checks are functions, or (function, args) for ones that take
+    # arguments. Returns the exit status, 1 if a check failed
+    for check in checks:
+        function, args = check if isinstance(check, tuple) else (check, ())
+        try:
+            function(*args)
+        except AssertionError as e:
+            print(f"FAIL {function.__name__}: {e}")
+            return 1
+        print(f"ok   {function.__name__}")
+    return 0
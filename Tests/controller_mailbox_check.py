@@ -0,0 +1,102 @@
+# Checks joystick.ControllerMailbox, the joystick thread to drive loop
+# handoff: slots start at rest, the generation counts writes, and a reader
+# racing a writer never sees a value or generation go backwards. Prints
+# read/write rates next to the lock the runtime used before. Exits 1 on
+# the first failure.
+# Run from the repo root: python Tests/controller_mailbox_check.py
+
+import os
+import sys
+import threading
+import time
+
+from evdev import ecodes
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from checks import run_checks  # noqa: E402
+from joystick import SLOTS, ControllerMailbox  # noqa: E402
+
+LEFT_Y = SLOTS[(ecodes.EV_ABS, ecodes.ABS_Y)]
+RIGHT_Y = SLOTS[(ecodes.EV_ABS, ecodes.ABS_RY)]
+WRITES = 200000
+
+
+def check_initial():
+    mailbox = ControllerMailbox()
+    generation, values = mailbox.read()
+    assert generation == 0
+    assert values[LEFT_Y] == 128 and values[RIGHT_Y] == 128
+    assert mailbox.get(ecodes.EV_ABS, ecodes.ABS_Z) == 0
+    assert mailbox.get(ecodes.EV_KEY, ecodes.BTN_TR) == 0
+
+
+def check_generation():
+    mailbox = ControllerMailbox()
+    mailbox.write(LEFT_Y, 10)
+    mailbox.write(RIGHT_Y, 20)
+    generation, values = mailbox.read()
+    assert generation == 2 and mailbox.generation == 2
+    assert values[LEFT_Y] == 10 and values[RIGHT_Y] == 20
+    # Reading doesn't count as a change
+    assert mailbox.read()[0] == 2
+
+
+def check_concurrent():
+    mailbox = ControllerMailbox()
+
+    def writer():
+        for n in range(WRITES):
+            mailbox.write(LEFT_Y, n)
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    last_generation = last_value = -1
+    reads = 0
+    while thread.is_alive():
+        generation, values = mailbox.read()
+        assert generation >= last_generation, (generation, last_generation)
+        assert values[LEFT_Y] >= last_value, (values[LEFT_Y], last_value)
+        last_generation, last_value = generation, values[LEFT_Y]
+        reads += 1
+    thread.join()
+    assert mailbox.generation == WRITES
+    assert mailbox.get(ecodes.EV_ABS, ecodes.ABS_Y) == WRITES - 1
+    print(f"     {reads} reads during {WRITES} writes")
+
+
+def rate(function, count=200000):
+    start = time.perf_counter()
+    for _ in range(count):
+        function()
+    return count / (time.perf_counter() - start)
+
+
+def report_rates():
+    mailbox = ControllerMailbox()
+    lock = threading.Lock()
+    state = {'left': 128, 'right': 128}
+
+    def locked_write():
+        with lock:
+            state['left'] = 100
+
+    def locked_read():
+        with lock:
+            return state['left'], state['right']
+
+    print(f"     mailbox write {rate(lambda: mailbox.write(LEFT_Y, 100)) / 1e6:.2f} M/s  "
+          f"read {rate(mailbox.read) / 1e6:.2f} M/s")
+    print(f"     lock    write {rate(locked_write) / 1e6:.2f} M/s  "
+          f"read {rate(locked_read) / 1e6:.2f} M/s")
+
+
+def main():
+    checks = [check_initial, check_generation, check_concurrent]
+    if run_checks(checks):
+        return 1
+    report_rates()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
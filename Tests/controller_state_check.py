@@ -0,0 +1,141 @@
+# Checks joystick.read_batches and joystick.ControllerState: reports are
+# split on SYN_REPORT, reports after SYN_DROPPED are discarded (or replaced
+# by the device's current state when there is a device), and every
+# axis, hat and button is tracked with its time and edge flags. Prints the
+# cost of one report. Exits 1 on the first failure.
+# Run from the repo root: python Tests/controller_state_check.py
+
+import os
+import sys
+import time
+
+from evdev import AbsInfo, InputEvent, ecodes
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from checks import run_checks  # noqa: E402
+from joystick import (AXES, BUTTONS, SLOTS, ControllerMailbox,  # noqa: E402
+                      ControllerState, read_batches)
+
+LEFT_Y = SLOTS[(ecodes.EV_ABS, ecodes.ABS_Y)]
+HAT_X = SLOTS[(ecodes.EV_ABS, ecodes.ABS_HAT0X)]
+TR = SLOTS[(ecodes.EV_KEY, ecodes.BTN_TR)]
+SOUTH = SLOTS[(ecodes.EV_KEY, ecodes.BTN_SOUTH)]
+
+
+def abs_event(code, value, t=100.0):
+    return InputEvent(int(t), int(t % 1 * 1e6), ecodes.EV_ABS, code, value)
+
+
+def key_event(code, value, t=100.0):
+    return InputEvent(int(t), int(t % 1 * 1e6), ecodes.EV_KEY, code, value)
+
+
+def syn(code=ecodes.SYN_REPORT, t=100.0):
+    return InputEvent(int(t), int(t % 1 * 1e6), ecodes.EV_SYN, code, 0)
+
+
+def check_slots():
+    assert len(SLOTS) == len(AXES) + len(BUTTONS)
+    assert sorted(SLOTS.values()) == list(range(len(SLOTS)))
+
+
+def check_batches():
+    stream = [abs_event(ecodes.ABS_Y, 10), abs_event(ecodes.ABS_RY, 20), syn(),
+              key_event(ecodes.BTN_TR, 1), syn(ecodes.SYN_DROPPED),
+              abs_event(ecodes.ABS_Y, 30), syn(),
+              abs_event(ecodes.ABS_Y, 40), syn()]
+    batches = [[e.value for e in batch] for batch in read_batches(stream)]
+    assert batches == [[10, 20], [40]], batches
+
+
+class FakeDevice:
+    # What InputDevice.absinfo and active_keys return for a held state
+    def __init__(self, axes, keys):
+        self.axes = axes
+        self.keys = keys
+
+    def absinfo(self, code):
+        if code not in self.axes:
+            raise OSError(22, "Invalid argument")
+        return AbsInfo(self.axes[code], 0, 255, 0, 0, 0)
+
+    def active_keys(self):
+        return list(self.keys)
+
+
+def check_resync():
+    # R1 went down and the left stick moved while events were dropped
+    axes = {code: 128 for code in AXES}
+    axes[ecodes.ABS_Y] = 30
+    del axes[ecodes.ABS_HAT0Y]
+    device = FakeDevice(axes, [ecodes.BTN_TR])
+    stream = [abs_event(ecodes.ABS_Y, 10), syn(), syn(ecodes.SYN_DROPPED),
+              abs_event(ecodes.ABS_Y, 20), syn(),
+              abs_event(ecodes.ABS_Y, 40), syn()]
+    batches = list(read_batches(stream, device))
+    assert len(batches) == 3, batches
+    assert len(batches[1]) == len(AXES) - 1 + len(BUTTONS)
+
+    state = ControllerState()
+    state.update(batches[0])
+    state.update(batches[1])
+    assert state.values[LEFT_Y] == 30 and state.values[TR] == 1
+    assert state.went_down(TR) and not state.went_down(SOUTH)
+    state.update(batches[2])
+    assert state.values[LEFT_Y] == 40
+
+
+def check_edges():
+    mailbox = ControllerMailbox()
+    state = ControllerState(mailbox)
+    assert state.values[LEFT_Y] == 128 and state.values[TR] == 0
+
+    changed = state.update([key_event(ecodes.BTN_TR, 1, 100.5),
+                            abs_event(ecodes.ABS_HAT0X, -1, 100.5)])
+    assert changed == 1 << TR | 1 << HAT_X, bin(changed)
+    assert state.went_down(TR) and not state.went_up(TR)
+    assert state.moved(HAT_X) and state.values[HAT_X] == -1
+    assert state.times[TR] == 100.5 and state.time == 100.5
+    assert mailbox.generation == 1
+
+    # Flags only cover the last report
+    state.update([abs_event(ecodes.ABS_Y, 0, 101.0)])
+    assert not state.moved(TR) and not state.went_down(TR)
+    assert state.moved(LEFT_Y) and state.times[TR] == 100.5
+
+    # Autorepeat (value 2) isn't a new press
+    state.update([key_event(ecodes.BTN_TR, 2)])
+    assert not state.went_down(TR) and state.moved(TR)
+
+    state.update([key_event(ecodes.BTN_TR, 0), key_event(ecodes.BTN_SOUTH, 1)])
+    assert state.went_up(TR) and state.went_down(SOUTH)
+
+    # Nothing changed: no flags and nothing published
+    generation = mailbox.generation
+    assert state.update([abs_event(ecodes.ABS_Y, 0),
+                         abs_event(ecodes.ABS_MT_POSITION_X, 5)]) == 0
+    assert mailbox.generation == generation
+    assert mailbox.read()[1] == state.values
+
+
+def report_cost(count=100000):
+    state = ControllerState(ControllerMailbox())
+    reports = [[abs_event(ecodes.ABS_Y, n % 256), abs_event(ecodes.ABS_RY, n % 256),
+                abs_event(ecodes.ABS_X, n % 256)] for n in range(256)]
+    start = time.perf_counter()
+    for n in range(count):
+        state.update(reports[n & 255])
+    elapsed = time.perf_counter() - start
+    print(f"     {elapsed / count * 1e6:.2f} us per 3 event report")
+
+
+def main():
+    checks = [check_slots, check_batches, check_resync, check_edges]
+    if run_checks(checks):
+        return 1
+    report_cost()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,68 @@
+# Compares the table-driven CRC16 in roboclaw_3 against the old bit loop,
+# and checks write packets match the old byte by byte writer, including
+# signed fields given unsigned values of 2**31 and up
+# Run from the repo root: python Tests/crc_benchmark.py
+
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from roboclaw_3 import _pack, crc16  # noqa: E402
+
+# Frame sizes seen on the bus: _write0, _write1 (ForwardM1), _writeS2S2
+# (DutyM1M2), _write4S4S4 (SpeedAccelM1M2), _read_n with 7 longs, ReadVersion
+PACKET_SIZES = [2, 3, 6, 14, 30, 48]
+REPEAT = 5
+
+
+def crc16_bitloop(data):
+    # Same algorithm as the original Roboclaw.crc_update
+    crc = 0
+    for byte in data:
+        crc = crc ^ (byte << 8)
+        for bit in range(0, 8):
+            if (crc & 0x8000) == 0x8000:
+                crc = ((crc << 1) ^ 0x1021)
+            else:
+                crc = crc << 1
+    return crc & 0xFFFF
+
+
+def pack_bytewise(address, cmd, fmt, *vals):
+    # Same bytes as the original _writebyte/_writeword/_writelong calls
+    data = bytearray((address, cmd))
+    for field, val in zip(fmt, vals):
+        size = {'B': 1, 'h': 2, 'H': 2, 'l': 4, 'L': 4}[field]
+        if size == 1:
+            data += val.to_bytes(1, 'big')
+        else:
+            data += (val & (1 << 8 * size) - 1).to_bytes(size, 'big')
+    return bytes(data) + crc16_bitloop(data).to_bytes(2, 'big')
+
+
+def main():
+    # Sanity checks before timing anything
+    for size in range(0, 64):
+        data = bytes(random.getrandbits(8) for i in range(size))
+        assert crc16(data) == crc16_bitloop(data), size
+    for fmt, vals in (('l', (2**31,)), ('l', (2**32 - 1,)), ('l', (-2**31,)),
+                      ('L', (-1,)), ('h', (40000,)), ('H', (-2,)),
+                      ('LlLB', (100, 2**31 + 5, 7, 1)), ('B', (255,))):
+        assert _pack(0x80, 1, fmt, *vals) == pack_bytewise(0x80, 1, fmt, *vals), \
+            (fmt, vals)
+
+    number = 20000
+    print(f"{'bytes':>6} {'bit loop (us)':>14} {'table (us)':>11} {'speedup':>8}")
+    for size in PACKET_SIZES:
+        data = bytes(random.getrandbits(8) for i in range(size))
+        old = min(timeit.repeat(lambda: crc16_bitloop(data),
+                                number=number, repeat=REPEAT)) / number
+        new = min(timeit.repeat(lambda: crc16(data),
+                                number=number, repeat=REPEAT)) / number
+        print(f"{size:>6} {old * 1e6:>14.2f} {new * 1e6:>11.2f} {old / new:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
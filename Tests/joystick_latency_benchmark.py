@@ -0,0 +1,113 @@
+# Compares the old read_one() busy-poll against the epoll reader in
+# joystick.py: CPU used while idle-ish and the delay from a stick event to
+# the drive loop picking it up (the point where the UART packet goes out).
+# Needs write access to /dev/uinput (sudo chmod 666 /dev/uinput)
+# Run from the repo root: python Tests/joystick_latency_benchmark.py
+
+import os
+import random
+import sys
+import threading
+import time
+
+from evdev import AbsInfo, UInput, ecodes
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from joystick import read_events  # noqa: E402
+
+EVENT_COUNT = 200  # Must stay below 255 so every value is unique
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def poll_reader(controller, state, stop):
+    # The loop every robot script used before
+    while not stop.is_set():
+        try:
+            event = controller.read_one()
+            if event is None:
+                time.sleep(0.002)
+                continue
+            if event.type == ecodes.EV_ABS and event.code == ecodes.ABS_Y:
+                state['value'] = event.value
+        except BlockingIOError:
+            time.sleep(0.002)
+
+
+def poll_drive(state, seen, stop):
+    last = None
+    while not stop.is_set():
+        value = state['value']
+        if value != last:
+            seen[value] = time.perf_counter()
+            last = value
+        time.sleep(0.02)
+
+
+def epoll_reader(controller, state, stop):
+    for event in read_events(controller):
+        if event.type == ecodes.EV_ABS and event.code == ecodes.ABS_Y:
+            state['value'] = event.value
+            state['moved'].set()
+
+
+def epoll_drive(state, seen, stop):
+    last = None
+    while not stop.is_set():
+        value = state['value']
+        if value != last:
+            seen[value] = time.perf_counter()
+            last = value
+        state['moved'].wait(0.02)
+        state['moved'].clear()
+
+
+def run(name, reader, drive):
+    # A fresh virtual stick per run so a reader left blocked from an earlier
+    # run can't steal events
+    stick = UInput({ecodes.EV_ABS: [(ecodes.ABS_Y, AbsInfo(128, 0, 255, 0, 0, 0))]},
+                   name=f"ME72 benchmark stick ({name})")
+    time.sleep(0.5)  # Give udev time to create the device node
+    controller = stick.device
+
+    state = {'value': 128, 'moved': threading.Event()}
+    seen = {}
+    sent = {}
+    stop = threading.Event()
+    threading.Thread(target=reader, args=(controller, state, stop),
+                     daemon=True).start()
+    threading.Thread(target=drive, args=(state, seen, stop),
+                     daemon=True).start()
+    time.sleep(0.1)
+
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    for i in range(0, EVENT_COUNT):
+        value = i + 1
+        sent[value] = time.perf_counter()
+        stick.write(ecodes.EV_ABS, ecodes.ABS_Y, value)
+        stick.syn()
+        time.sleep(random.uniform(0.01, 0.05))
+    time.sleep(0.1)
+    cpu = time.process_time() - cpu_start
+    wall = time.perf_counter() - wall_start
+    stop.set()
+    stick.close()
+
+    latencies = [(seen[v] - sent[v]) * 1000 for v in sent if v in seen]
+    print(f"{name:>6}: cpu {cpu / wall * 100:5.1f}%  "
+          f"latency p50 {percentile(latencies, 50):6.2f} ms  "
+          f"p99 {percentile(latencies, 99):6.2f} ms  "
+          f"({len(latencies)}/{EVENT_COUNT} values seen)")
+
+
+def main():
+    run("poll", poll_reader, poll_drive)
+    run("epoll", epoll_reader, epoll_drive)
+
+
+if __name__ == "__main__":
+    main()
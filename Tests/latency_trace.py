@@ -0,0 +1,121 @@
+# Stick to ACK latency per stage (see latency.py) for the robot runtime
+# driving the pty simulator (roboclaw_sim.py). The input is a synthetic
+# stick stream: both sticks wander like a driver would, one report every
+# 4-12 ms, fed to Robot.handle_batch as the joystick thread would.
+# Run from the repo root: python Tests/latency_trace.py
+#   --baud 460800             simulated link speed, default 38400
+#   --seconds 10              length of the stream
+#   --output latency.json     save the histograms
+#   --replay drive.evt        use a recording from inputlog.py instead
+#   --speed 4                 replay speed, 0 for as fast as possible
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+from evdev import InputEvent, ecodes
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import inputlog  # noqa: E402
+from latency import STAGES, LatencyTracer  # noqa: E402
+from matchlog import MatchLog  # noqa: E402
+from robot.config import RoleConfig  # noqa: E402
+from robot.runtime import Robot  # noqa: E402
+from roboclaw_sim import RoboclawSimulator  # noqa: E402
+
+ADDRESS = 0x80
+
+
+def synthetic_stream(seconds, seed=1):
+    # (delay before the event, type, code, value), both sticks drifting
+    rng = random.Random(seed)
+    values = {ecodes.ABS_Y: 128, ecodes.ABS_RY: 128}
+    elapsed = 0.0
+    while elapsed < seconds:
+        delay = rng.uniform(0.004, 0.012)
+        elapsed += delay
+        code = rng.choice(list(values))
+        values[code] = max(0, min(255, values[code] + rng.randint(-12, 12)))
+        yield delay, ecodes.EV_ABS, code, values[code]
+
+
+def play(robot, stream):
+    # Events are stamped with the wall clock when they are "read", like
+    # the kernel does, then handed to the runtime
+    for delay, type, code, value in stream:
+        time.sleep(delay)
+        now = time.time()
+        robot.handle_batch([InputEvent(int(now), int(now % 1 * 1e6),
+                                       type, code, value)])
+
+
+def play_recording(robot, path, speed):
+    # A recording from inputlog.py, through the same poll_joystick loop
+    # the controller thread runs
+    robot.poll_joystick(inputlog.replay(path, speed))
+
+
+def run(baud, stream, replay=None, speed=1.0):
+    with RoboclawSimulator(addresses=(ADDRESS,), baud=baud) as sim:
+        config = RoleConfig('trace', drive_address=ADDRESS, port=sim.port,
+                            baud=baud)
+        tracer = LatencyTracer(ADDRESS)
+        robot = Robot(config, tracer)
+        if not robot.bus.open():
+            raise RuntimeError(f"Could not open {sim.port}")
+        with tempfile.TemporaryDirectory() as tmp:
+            robot.match_log = MatchLog(os.path.join(tmp, 'trace.bin'))
+            threading.Thread(target=robot.send_motor_command,
+                             daemon=True).start()
+            start = time.monotonic()
+            sent = robot.drive.packets_sent
+            if replay:
+                play_recording(robot, replay, speed)
+            else:
+                play(robot, stream)
+            time.sleep(0.1)
+            rate = (robot.drive.packets_sent - sent) / (time.monotonic() - start)
+            # The drive thread keeps running until exit, so the log stays
+            # open and is removed with the directory
+        report = tracer.histograms()
+        report['packets_per_s'] = rate
+        report['drive_loop'] = robot.drive_loop.stats()
+        return report
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--baud', type=int, default=38400)
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--output')
+    parser.add_argument('--replay')
+    parser.add_argument('--speed', type=float, default=1.0)
+    args = parser.parse_args()
+
+    report = run(args.baud, synthetic_stream(args.seconds), args.replay,
+                 args.speed)
+    for stage in STAGES:
+        result = report[stage]
+        print(f"{stage:>7}: {result['count']:5d} traces  "
+              f"p50 {result['p50_ms']:6.2f} ms  p99 {result['p99_ms']:6.2f} ms  "
+              f"max {result['max_ms']:6.2f} ms")
+        print("         " + "  ".join(f"{label} {count}" for label, count
+                                      in result['histogram'].items()))
+    print(f"superseded {report['superseded']}  unsent {report['unsent']}  "
+          f"lost {report['lost']}")
+    loop = report['drive_loop']
+    print(f"drive packets {report['packets_per_s']:.1f}/s  ticks {loop['ticks']}  "
+          f"early {loop['early']}  deferred {loop['deferred']}  "
+          f"skipped {loop['skipped']}")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+# Tick jitter of a 50 Hz loop shaped like send_motor_command, with console
+# output done four ways: none, print() per tick, robotlog at DEBUG (queued
+# and rate limited) and robotlog at INFO (the debug lines are gated off).
+# The console is a stream whose writes take WRITE_DELAY, roughly what a
+# busy SSH session to a Pi Zero costs.
+# Run from the repo root: python Tests/logging_jitter_benchmark.py
+
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import robotlog  # noqa: E402
+
+PERIOD = 0.02
+TICKS = 250
+WRITE_DELAY = 0.003
+MESSAGES_PER_TICK = 3  # Two stick events and a speed change
+
+
+class SlowStream:
+    'A console that blocks its writer for WRITE_DELAY per write'
+
+    def write(self, text):
+        time.sleep(WRITE_DELAY)
+
+    def flush(self):
+        pass
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def run(name, emit):
+    lateness = []
+    next_tick = time.perf_counter()
+    for i in range(0, TICKS):
+        next_tick += PERIOD
+        for j in range(0, MESSAGES_PER_TICK):
+            emit(i, j)
+        delay = next_tick - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        lateness.append((time.perf_counter() - next_tick) * 1000)
+    print(f"{name:>14}: jitter p50 {percentile(lateness, 50):6.2f} ms  "
+          f"p99 {percentile(lateness, 99):6.2f} ms  "
+          f"max {max(lateness):6.2f} ms  "
+          f"overruns {sum(1 for late in lateness if late > PERIOD * 1000)}")
+
+
+def main():
+    console = SlowStream()
+    run("no output", lambda i, j: None)
+    run("print", lambda i, j: print(f"Joystick Left Y: {i}", file=console))
+
+    robotlog.setup(logging.DEBUG, stream=console)
+    log = robotlog.get_logger('benchmark')
+    run("robotlog DEBUG", lambda i, j: log.debug("Joystick Left Y: %d", i))
+
+    logging.getLogger(robotlog.ROOT).setLevel(logging.INFO)
+    run("robotlog INFO", lambda i, j: log.debug("Joystick Left Y: %d", i))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+# Checks drive.ResponseCurve over every raw stick value 0-255, and the
+# curves each role in robot.config builds. Exits 1 on the first failure.
+# Run from the repo root: python Tests/response_curve_check.py
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from checks import run_checks  # noqa: E402
+from drive import ResponseCurve  # noqa: E402
+
+VALUES = range(0, 256)
+
+
+def check_dead_zone():
+    curve = ResponseCurve(116, 134)
+    for value in VALUES:
+        command = curve(value)
+        if 116 <= value <= 134:
+            assert command == 0, (value, command)
+        elif value < 116:
+            assert command > 0, (value, command)
+        else:
+            assert command < 0, (value, command)
+    assert curve(128) == 0
+
+
+def check_endpoints_and_range():
+    for max_output in (0, 1, 64, 127):
+        curve = ResponseCurve(116, 134, max_output=max_output)
+        assert curve(0) == max_output
+        assert curve(255) == -max_output
+        for value in VALUES:
+            assert -max_output <= curve(value) <= max_output
+
+
+def check_monotonic():
+    for expo in (0.0, 0.3, 1.0):
+        table = ResponseCurve(118, 138, expo=expo).table
+        assert len(table) == 256
+        for value in range(1, 256):
+            assert table[value] <= table[value - 1], (expo, value)
+
+
+def check_first_step_moves():
+    # The first value outside the dead zone already gives +-1
+    curve = ResponseCurve(116, 134)
+    assert curve(115) == 1
+    assert curve(135) == -1
+
+
+def check_expo():
+    linear = ResponseCurve(116, 134)
+    shaped = ResponseCurve(116, 134, expo=0.6)
+    for value in VALUES:
+        assert abs(shaped(value)) <= abs(linear(value)), value
+    assert shaped(0) == linear(0) and shaped(255) == linear(255)
+
+
+def check_invert():
+    curve = ResponseCurve(116, 134)
+    inverted = ResponseCurve(116, 134, invert=True)
+    for value in VALUES:
+        assert inverted(value) == -curve(value), value
+
+
+def check_original_halving():
+    # Full deflection matches the old ceil((127 - value) / 2) mapping
+    curve = ResponseCurve(116, 134)
+    assert curve(0) == 64
+    assert curve(255) == -64
+
+
+def check_bad_curves():
+    # The old constants had lower above upper, so nothing was a dead zone
+    for args in ((134, 116), (0, 10), (200, 255)):
+        try:
+            ResponseCurve(*args)
+        except ValueError:
+            continue
+        raise AssertionError(f"ResponseCurve{args} was accepted")
+    for kwargs in ({'expo': -0.1}, {'expo': 1.5}, {'max_output': 128}):
+        try:
+            ResponseCurve(**kwargs)
+        except ValueError:
+            continue
+        raise AssertionError(f"ResponseCurve({kwargs}) was accepted")
+
+
+def check_roles():
+    try:
+        from robot.config import ROLES
+    except ImportError as e:  # evdev isn't installed everywhere
+        print(f"skipped role check: {e}")
+        return
+    for name, config in ROLES.items():
+        for invert in (config.left_invert, config.right_invert):
+            curve = ResponseCurve(config.lower_dead_zone,
+                                  config.upper_dead_zone, config.expo,
+                                  config.max_output, invert=invert)
+            assert curve(128) == 0, name
+            sign = -1 if invert else 1
+            assert sign * curve(0) > 0 and sign * curve(255) < 0, name
+
+
+def main():
+    checks = [check_dead_zone, check_endpoints_and_range, check_monotonic,
+              check_first_step_moves, check_expo, check_invert,
+              check_original_halving, check_bad_curves, check_roles]
+    return run_checks(checks)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
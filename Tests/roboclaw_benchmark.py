@@ -0,0 +1,156 @@
+# Command throughput and round-trip time of roboclaw_3.Roboclaw for each
+# command family, run against the pty simulator (roboclaw_sim.py) so it
+# works on any Linux box.
+# Run from the repo root: python Tests/roboclaw_benchmark.py
+#   --output results.json     save the results
+#   --baseline results.json   compare against saved results, exit 1 if any
+#                             p50 got more than --tolerance slower
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from roboclaw_3 import Roboclaw  # noqa: E402
+from roboclaw_sim import RoboclawSimulator  # noqa: E402
+
+ADDRESS = 0x80
+
+# family name -> (helper it exercises, call)
+FAMILIES = {
+    'write1': ('_write1', lambda r: r.ForwardM1(ADDRESS, 32)),
+    'writeS2': ('_writeS2', lambda r: r.DutyM1(ADDRESS, -8000)),
+    'write4S4S4': ('_write4S4S4', lambda r: r.SpeedAccelM1M2(ADDRESS, 5000, 1000, -1000)),
+    'read4_1': ('_read4_1', lambda r: r.ReadEncM1(ADDRESS)),
+    'read_n': ('_read_n', lambda r: r.ReadM1VelocityPID(ADDRESS)),
+    'version': ('ReadVersion', lambda r: r.ReadVersion(ADDRESS)),
+    'snapshot': ('ReadStatusSnapshot', lambda r: r.ReadStatusSnapshot(ADDRESS)),
+}
+
+
+class CountingPort:
+    'Wraps the serial port to count bytes each way'
+
+    def __init__(self, port):
+        self.port = port
+        self.written = 0
+        self.read_bytes = 0
+
+    def write(self, data):
+        self.written += len(data)
+        return self.port.write(data)
+
+    def read(self, size=1):
+        data = self.port.read(size)
+        self.read_bytes += len(data)
+        return data
+
+    @property
+    def timeout(self):
+        return self.port.timeout
+
+    @timeout.setter
+    def timeout(self, value):
+        self.port.timeout = value
+
+    def __getattr__(self, name):
+        return getattr(self.port, name)
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def run_family(roboclaw, call, count):
+    port = roboclaw._port
+    for i in range(0, 10):  # Warm up
+        call(roboclaw)
+    port.written = port.read_bytes = 0
+    times = []
+    failures = 0
+    start = time.perf_counter()
+    for i in range(0, count):
+        t = time.perf_counter()
+        result = call(roboclaw)
+        times.append(time.perf_counter() - t)
+        if result in (False, None) or (isinstance(result, (tuple, list)) and not result[0]):
+            failures += 1
+    elapsed = time.perf_counter() - start
+    return {
+        'count': count,
+        'failures': failures,
+        'p50_ms': percentile(times, 50) * 1000,
+        'p99_ms': percentile(times, 99) * 1000,
+        'commands_per_s': count / elapsed,
+        'bytes_per_s': (port.written + port.read_bytes) / elapsed,
+    }
+
+
+def run(bauds, count):
+    results = {}
+    for baud in bauds:
+        with RoboclawSimulator(addresses=(ADDRESS,), baud=baud) as sim:
+            roboclaw = Roboclaw(sim.port, baud)
+            if not roboclaw.Open():
+                raise RuntimeError(f"Could not open {sim.port}")
+            roboclaw._port = CountingPort(roboclaw._port)
+            for name, (helper, call) in FAMILIES.items():
+                result = run_family(roboclaw, call, count)
+                result['helper'] = helper
+                results[f"{baud}/{name}"] = result
+                print(f"{baud:>7} {name:<11} p50 {result['p50_ms']:6.2f} ms  "
+                      f"p99 {result['p99_ms']:6.2f} ms  "
+                      f"{result['commands_per_s']:7.1f} cmd/s  "
+                      f"{result['bytes_per_s']:8.0f} B/s  "
+                      f"{result['failures']} failed")
+            for address, stats in roboclaw.policy.stats().items():
+                print(f"{baud:>7} 0x{address:02x} timeout {stats['timeout_ms']:.2f} ms  "
+                      f"rtt p99 {stats['rtt_p99_ms']:.2f} ms  "
+                      f"{stats['retries']} retries  {stats['timeouts']} timeouts")
+            roboclaw._port.close()
+    return results
+
+
+def compare(results, baseline, tolerance):
+    # Returns the keys whose p50 is more than tolerance slower than baseline
+    slower = []
+    for key, result in results.items():
+        old = baseline.get(key)
+        if old and result['p50_ms'] > old['p50_ms'] * (1 + tolerance):
+            slower.append(key)
+            print(f"REGRESSION {key}: p50 {old['p50_ms']:.2f} -> "
+                  f"{result['p50_ms']:.2f} ms")
+    return slower
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--baud', type=int, action='append',
+                        help="Baud rate(s) to test, default 38400 and 460800")
+    parser.add_argument('--count', type=int, default=200)
+    parser.add_argument('--output')
+    parser.add_argument('--baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    args = parser.parse_args()
+
+    results = run(args.baud or [38400, 460800], args.count)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'python': platform.python_version(),
+                       'machine': platform.machine(),
+                       'time': time.time(),
+                       'results': results}, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        if compare(results, baseline, args.tolerance):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
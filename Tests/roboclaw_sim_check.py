@@ -0,0 +1,74 @@
+# Checks roboclaw_sim.py against roboclaw_3.Roboclaw: duty set-points ramp
+# at the Set Default Accel rate, and faults are injected on the requests the
+# simulator receives as well as on its responses. Exits 1 on the first
+# failure.
+# Run from the repo root: python Tests/roboclaw_sim_check.py
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from checks import run_checks  # noqa: E402
+from roboclaw_3 import Roboclaw  # noqa: E402
+from roboclaw_sim import MAX_DUTY, RoboclawSimulator, SimMotor  # noqa: E402
+
+ADDRESS = 0x80
+BAUD = 38400
+
+
+def check_default_accel():
+    motor = SimMotor(max_speed=3000, accel=6000)
+    motor.set_duty(MAX_DUTY)
+    motor.step(0.25)
+    assert motor.speed == 1500, motor.speed
+    # Full duty per second: half way after half a second
+    motor = SimMotor(max_speed=3000, accel=6000)
+    motor.default_accel = MAX_DUTY
+    motor.set_duty(MAX_DUTY)
+    motor.step(0.5)
+    assert motor.speed == 1500, motor.speed
+    # A duty command with its own acceleration ignores the default
+    motor.set_duty(0, MAX_DUTY * 2)
+    motor.step(0.5)
+    assert motor.speed == 0, motor.speed
+
+    with RoboclawSimulator(baud=BAUD) as sim:
+        roboclaw = Roboclaw(sim.port, BAUD)
+        assert roboclaw.Open(), f"Could not open {sim.port}"
+        assert roboclaw.SetM1DefaultAccel(ADDRESS, MAX_DUTY)
+        assert roboclaw.ForwardM1(ADDRESS, 127)
+        m1 = sim.devices[ADDRESS].m1
+        assert m1.rate == m1.max_speed, m1.rate
+        assert roboclaw.ForwardM2(ADDRESS, 127)
+        m2 = sim.devices[ADDRESS].m2
+        assert m2.rate == m2.accel, m2.rate
+
+
+def check_request_faults():
+    # Every request loses a byte: nothing is applied or answered
+    with RoboclawSimulator(baud=BAUD, drop_rate=1.0, seed=1) as sim:
+        roboclaw = Roboclaw(sim.port, BAUD, retries=2)
+        assert roboclaw.Open(), f"Could not open {sim.port}"
+        assert not roboclaw.ForwardM1(ADDRESS, 64)
+        assert sim.dropped_packets == 2 and sim.dropped_bytes == 0
+        assert sim.devices[ADDRESS].m1.target == 0
+        assert roboclaw.ReadEncM1(ADDRESS)[0] == 0
+    # Every write fails its CRC on the way in, every read response on the
+    # way out
+    with RoboclawSimulator(baud=BAUD, corrupt_rate=1.0, seed=1) as sim:
+        roboclaw = Roboclaw(sim.port, BAUD, retries=2)
+        assert roboclaw.Open(), f"Could not open {sim.port}"
+        assert not roboclaw.ForwardM1(ADDRESS, 64)
+        assert sim.crc_errors == 2 and sim.corrupted == 2
+        assert sim.devices[ADDRESS].m1.target == 0
+        assert roboclaw.ReadEncM1(ADDRESS)[0] == 0
+        assert sim.corrupted > 2, sim.corrupted
+
+
+def main():
+    checks = [check_default_accel, check_request_faults]
+    return run_checks(checks)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
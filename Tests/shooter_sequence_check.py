@@ -0,0 +1,183 @@
+# Checks shooter.ShooterSequencer against a fake shooter handle, with the
+# clock passed in explicitly so every timing is exact. Exits 1 on the
+# first failure.
+# Run from the repo root: python Tests/shooter_sequence_check.py
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from checks import run_checks  # noqa: E402
+from shooter import (COOLDOWN, FIRE, IDLE, INTAKE, SPIN_UP,  # noqa: E402
+                     ShooterSequencer)
+
+
+class FakeShooter:
+    # Records the signed speed for M1 only, M2 always gets the same. The
+    # first lost_stops stops sent to M2 are not ACKed
+    def __init__(self):
+        self.commands = []
+        self.lost_stops = 0
+
+    def ForwardM1(self, speed):
+        self.commands.append(speed)
+        return True
+
+    def BackwardM1(self, speed):
+        self.commands.append(-speed)
+        return True
+
+    def ForwardM2(self, speed):
+        if speed == 0 and self.lost_stops:
+            self.lost_stops -= 1
+            return False
+        return True
+
+    def BackwardM2(self, speed):
+        return True
+
+
+def sequencer():
+    shooter = FakeShooter()
+    return ShooterSequencer(shooter, spin_up=0.25, fire=0.75,
+                            cooldown=0.25), shooter.commands
+
+
+def check_shot():
+    seq, commands = sequencer()
+    seq.request_shoot()
+    seq.update(0.0)
+    assert seq.state == SPIN_UP and commands == [63], (seq.state, commands)
+    seq.update(0.3)
+    assert seq.state == FIRE and commands == [63], commands
+    seq.update(1.0)
+    assert seq.state == COOLDOWN and commands == [63, 0], commands
+    seq.update(1.25)
+    assert seq.state == IDLE and commands == [63, 0], commands
+
+
+def check_intake():
+    seq, commands = sequencer()
+    seq.request_intake()
+    seq.update(0.0)
+    assert seq.state == INTAKE and commands == [-16]
+    seq.update(4.99)
+    assert seq.state == INTAKE
+    seq.update(5.0)
+    assert seq.state == IDLE and commands == [-16, 0], commands
+
+
+def check_mashing_extends():
+    # The old per-press threads stopped the intake 5 s after the first
+    # press. Now every press restarts the countdown, and sends nothing
+    seq, commands = sequencer()
+    for press in range(10):
+        seq.request_intake()
+        seq.update(press * 0.5)
+    assert commands == [-16], commands
+    assert seq.extended == 9
+    seq.update(9.4)
+    assert seq.state == INTAKE
+    seq.update(9.5)
+    assert seq.state == IDLE and commands == [-16, 0], commands
+
+
+def check_shoot_while_firing():
+    seq, commands = sequencer()
+    seq.request_shoot()
+    seq.update(0.0)
+    seq.request_shoot()  # Ignored while spinning up
+    seq.update(0.1)
+    seq.update(0.5)
+    seq.request_shoot()  # Fire for another 0.75 s from here
+    seq.update(0.8)
+    seq.update(1.5)
+    assert seq.state == FIRE, seq.state
+    seq.update(1.55)
+    assert seq.state == COOLDOWN and commands == [63, 0], commands
+
+
+def check_intake_after_cooldown():
+    # Intake during a shot stops the flywheels first, then reverses them
+    # once the cooldown is over
+    seq, commands = sequencer()
+    seq.request_shoot()
+    seq.update(0.0)
+    seq.request_intake()
+    seq.update(0.5)
+    assert seq.state == COOLDOWN and commands == [63, 0], commands
+    seq.update(0.7)
+    assert seq.state == COOLDOWN
+    seq.update(0.75)
+    assert seq.state == INTAKE and commands == [63, 0, -16], commands
+    seq.update(5.74)
+    assert seq.state == INTAKE
+    seq.update(5.75)
+    assert seq.state == IDLE
+
+
+def check_toggle_from_intake():
+    # R2 during the intake stops the reversed flywheels before firing
+    seq, commands = sequencer()
+    seq.request_intake()
+    seq.update(0.0)
+    seq.request_toggle()
+    seq.update(1.0)
+    assert seq.state == COOLDOWN and commands == [-16, 0], commands
+    seq.update(1.2)
+    assert seq.state == COOLDOWN
+    seq.update(1.25)
+    assert seq.state == FIRE and commands == [-16, 0, 64], commands
+    # A second toggle during that cooldown cancels the pending FIRE
+    seq, commands = sequencer()
+    seq.request_intake()
+    seq.update(0.0)
+    seq.request_toggle()
+    seq.update(1.0)
+    seq.request_toggle()
+    seq.update(1.1)
+    seq.update(1.25)
+    assert seq.state == IDLE and commands == [-16, 0], commands
+
+
+def check_lost_stop():
+    # A stop that isn't ACKed is sent again on every update until it is
+    shooter = FakeShooter()
+    seq = ShooterSequencer(shooter, spin_up=0.25, fire=0.75, cooldown=0.25)
+    seq.request_shoot()
+    seq.update(0.0)
+    shooter.lost_stops = 2
+    # The fake answers at once, so the first resend is in the same update
+    seq.update(1.0)
+    assert shooter.commands == [63, 0, 0], shooter.commands
+    seq.update(1.02)
+    assert shooter.commands == [63, 0, 0, 0] and seq.resent == 2
+    seq.update(1.04)
+    assert shooter.commands == [63, 0, 0, 0] and seq.stops is None
+    # A set-point after the stop replaces it
+    shooter.lost_stops = 1
+    seq.request_intake()
+    seq.update(2.0)
+    assert seq.stops is None and shooter.commands[-1] == -16
+
+
+def check_late_update():
+    # One late update runs every state that ended in the meantime, timed
+    # from the deadlines rather than from the late call
+    seq, commands = sequencer()
+    seq.request_shoot()
+    seq.update(0.0)
+    seq.update(10.0)
+    assert seq.state == IDLE and commands == [63, 0], (seq.state, commands)
+    assert seq.transitions == 4
+
+
+def main():
+    checks = [check_shot, check_intake, check_mashing_extends,
+              check_shoot_while_firing, check_intake_after_cooldown,
+              check_toggle_from_intake, check_lost_stop, check_late_update]
+    return run_checks(checks)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,144 @@
+# Replays a recorded stream (inputlog.py) in which R2 is held for a second
+# at a time while both sticks keep moving, through the attacker runtime on
+# the pty simulator (roboclaw_sim.py). Checks that:
+# - R2 toggles the shooter exactly once per press, even with the trigger
+#   value jittering around the threshold
+# - every stick event is handled while R2 is held, none wait for release
+# - no report takes long to handle
+# Exits 1 on the first failure.
+# Run from the repo root: python Tests/trigger_replay_check.py
+#   --speed 4    replay speed, default 4, 0 for as fast as possible
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+from evdev import InputEvent, ecodes
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from checks import run_checks  # noqa: E402
+import inputlog  # noqa: E402
+from joystick import TriggerToggle, read_batches  # noqa: E402
+from robot.config import ROLES, RoleConfig  # noqa: E402
+from robot.runtime import Robot  # noqa: E402
+from roboclaw_sim import RoboclawSimulator  # noqa: E402
+from shooter import COOLDOWN, IDLE  # noqa: E402
+
+# R2 is held over these (start, end) seconds of the recording
+PRESSES = ((0.5, 1.5), (2.0, 3.0))
+SECONDS = 3.5
+MAX_HANDLE_MS = 5.0
+
+
+def trigger_value(t, rng):
+    for start, end in PRESSES:
+        if start <= t < end:
+            if t - start < 0.05:
+                return int((t - start) / 0.05 * 200)  # Pulling it in
+            return 200 + rng.randint(-6, 6)  # Hovering around 200
+    return 0
+
+
+def write_recording(path, seed=1):
+    # Sticks and R2 each report every 4-12 ms, with SYN after each event
+    rng = random.Random(seed)
+    recorder = inputlog.InputRecorder(path)
+    values = {ecodes.ABS_Y: 128, ecodes.ABS_RY: 128}
+    t = 0.0
+    base = 1700000000.0
+    while t < SECONDS:
+        t += rng.uniform(0.004, 0.012)
+        if rng.random() < 0.5:
+            code = rng.choice(list(values))
+            values[code] = max(0, min(255, values[code] + rng.randint(-12, 12)))
+            value = values[code]
+        else:
+            code = ecodes.ABS_Z
+            value = max(0, min(255, trigger_value(t, rng)))
+        stamp = base + t
+        sec, usec = int(stamp), int(stamp % 1 * 1e6)
+        recorder.write(InputEvent(sec, usec, ecodes.EV_ABS, code, value))
+        recorder.write(InputEvent(sec, usec, ecodes.EV_SYN, ecodes.SYN_REPORT, 0))
+    recorder.close()
+
+
+def check_hysteresis():
+    trigger = TriggerToggle()
+    toggles = sum(trigger.update(v) for v in
+                  (0, 150, 201, 199, 205, 150, 201, 120, 99, 50, 210, 0))
+    assert toggles == 2, toggles
+    assert trigger.on is False
+    try:
+        TriggerToggle(press=100, release=100)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("TriggerToggle(100, 100) was accepted")
+
+
+def check_replay(speed):
+    attacker = ROLES['attacker']
+    with tempfile.TemporaryDirectory() as tmp, \
+            RoboclawSimulator(addresses=(attacker.drive_address,
+                                         attacker.shooter_address)) as sim:
+        path = os.path.join(tmp, 'r2.evt')
+        write_recording(path)
+        config = RoleConfig('replay', shooter_address=attacker.shooter_address,
+                            buttons=attacker.buttons, port=sim.port)
+        robot = Robot(config)
+        assert robot.bus.open(), f"Could not open {sim.port}"
+
+        class NoLog:
+            def write(self, *args):
+                pass
+        robot.match_log = NoLog()
+        threading.Thread(target=robot.send_motor_command, daemon=True).start()
+
+        toggles = []
+        request_toggle = robot.sequencer.request_toggle
+        robot.sequencer.request_toggle = lambda: (
+            toggles.append(time.perf_counter()), request_toggle())
+        held_sticks = 0
+        slowest = 0.0
+        last = {}
+        for batch in read_batches(inputlog.replay(path, speed)):
+            start = time.perf_counter()
+            robot.handle_batch(batch)
+            slowest = max(slowest, time.perf_counter() - start)
+            for event in batch:
+                if event.code in (ecodes.ABS_Y, ecodes.ABS_RY):
+                    last[event.code] = event.value
+                    if robot.shooter_trigger.held:
+                        held_sticks += 1
+                        # Stored straight away, not after R2 is released
+                        stored = robot.controls.get(event.type, event.code)
+                        assert stored == event.value, (event.code, stored)
+        time.sleep(0.1)
+
+        assert len(toggles) == len(PRESSES), toggles
+        assert held_sticks > 100, held_sticks
+        assert slowest * 1000 < MAX_HANDLE_MS, f"{slowest * 1000:.2f} ms"
+        # On after the first press (FIRE), off after the second (COOLDOWN)
+        assert robot.sequencer.transitions >= 2, robot.sequencer.transitions
+        assert robot.sequencer.state in (COOLDOWN, IDLE), robot.sequencer.state
+        for code, value in last.items():
+            assert robot.controls.get(ecodes.EV_ABS, code) == value, code
+        print(f"     {held_sticks} stick events handled with R2 held, "
+              f"slowest report {slowest * 1000:.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--speed', type=float, default=4.0)
+    args = parser.parse_args()
+
+    checks = [check_hysteresis, (check_replay, (args.speed,))]
+    return run_checks(checks)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,304 @@
+import collections
+import threading
+import time
+
+from roboclaw_3 import Roboclaw
+
+# Priority classes, lower runs first
+ESTOP = 0
+DRIVE = 1
+SHOOTER = 2
+TELEMETRY = 3
+PRIORITY_NAMES = ('estop', 'drive', 'shooter', 'telemetry')
+
+# Set-point commands, a newer one for the same motor replaces a queued one.
+# Distance/position moves are buffered on the Roboclaw so they never are
+SETPOINT_PREFIXES = ('Forward', 'Backward', 'Duty', 'Speed')
+BUFFERED_COMMANDS = ('Distance', 'Position')
+
+
+class RoboclawBus:
+    'One serial port shared by every Roboclaw on the daisy chain'
+
+    def __init__(self, comport, rate, timeout=None, retries=None, pipeline=1,
+                 policy=None):
+        self.roboclaw = Roboclaw(comport, rate, timeout, retries, policy)
+        # Up to this many set-point writes, each to a different address, are
+        # sent back to back before waiting for their ACKs
+        self.pipeline = pipeline
+        self._queues = [collections.deque() for name in PRIORITY_NAMES]
+        self._ready = threading.Condition()
+        self._stats = [_ClassStats() for name in PRIORITY_NAMES]
+        self._worker = None
+        self._batch_owner = None  # Thread inside batch(), see batch()
+
+    def open(self):
+        # Opens the port and starts the thread that owns it
+        if not self.roboclaw.Open():
+            return 0
+        if self._worker is None:
+            self._worker = threading.Thread(target=self._run, daemon=True)
+            self._worker.start()
+        return 1
+
+    def handle(self, address, priority=DRIVE, deadline=None, wait=True):
+        return RoboclawHandle(self, address, priority, deadline, wait)
+
+    def call(self, name, address, *args, priority=DRIVE, deadline=None,
+             wait=True):
+        # Runs Roboclaw.<name>(address, *args) on the bus thread, highest
+        # priority class first, and waits for its result. deadline is in
+        # seconds from now, a request still queued after it is dropped and
+        # returns False. With wait=False it only queues the request and
+        # returns it, see _Request.poll
+        if threading.current_thread() is self._worker:
+            return getattr(self.roboclaw, name)(address, *args)
+        if self._worker is None:
+            # Nothing would ever run it
+            raise RuntimeError(f"{self.roboclaw.comport} is not open")
+        request = _Request(name, address, args, priority, deadline)
+        with self._ready:
+            self._enqueue(request)
+            if wait and self._batch_owner is threading.current_thread():
+                self._batch_owner = None  # Release the batch, then wait
+            self._ready.notify()
+        if not wait:
+            return request
+        return request.wait()
+
+    def batch(self):
+        # with bus.batch(): the bus starts nothing new except ESTOP
+        # requests until the block makes its first waiting call or ends, so
+        # set-points queued in it with wait=False go out pipelined with
+        # that call
+        return _Batch(self)
+
+    def stats(self):
+        # Per priority class: requests run, coalesced, expired, pipelined,
+        # and the queue + transaction latency in ms
+        with self._ready:
+            return {name: stats.summary()
+                    for name, stats in zip(PRIORITY_NAMES, self._stats)}
+
+    def link_stats(self):
+        # Per address: current read timeout, round trip percentiles, retries
+        # and timeouts (see roboclaw_3.TransportPolicy)
+        return self.roboclaw.policy.stats()
+
+    def _enqueue(self, request):
+        if request.priority == ESTOP:
+            # Anything queued to move this address would undo the stop
+            for queue, stats in zip(self._queues[1:], self._stats[1:]):
+                for stale in [r for r in queue if r.address == request.address
+                              and r.motor is not None]:
+                    queue.remove(stale)
+                    stats.coalesced += 1
+                    stale.finish(False)
+        queue = self._queues[request.priority]
+        if request.motor is not None:
+            for stale in [r for r in queue if r.motor == request.motor
+                          and r.address == request.address]:
+                # Same motor: the newer set-point wins, the caller of the
+                # old one gets the new one's result
+                queue.remove(stale)
+                self._stats[request.priority].coalesced += 1
+                request.followers.append(stale)
+                request.followers.extend(stale.followers)
+        queue.append(request)
+
+    def _next(self):
+        # The next request to run, plus set-points for other addresses that
+        # can be pipelined behind it
+        with self._ready:
+            while True:
+                queues = self._queues
+                if self._batch_owner is not None:
+                    # Held for batch(), but a stop never waits for it
+                    queues = queues[:ESTOP + 1]
+                for queue in queues:
+                    if queue:
+                        break
+                else:
+                    self._ready.wait()
+                    continue
+                request = queue.popleft()
+                if self._expired(request):
+                    continue
+                batch = [request]
+                if self.pipeline > 1 and self._frame(request):
+                    for queue in queues:
+                        for other in list(queue):
+                            if len(batch) == self.pipeline:
+                                break
+                            if (other.address not in [r.address for r in batch]
+                                    and not self._expired(other, queue)
+                                    and self._frame(other, queue)):
+                                queue.remove(other)
+                                batch.append(other)
+                if request.done.is_set():
+                    continue  # Its frame could not be built
+                return batch
+
+    def _expired(self, request, queue=None):
+        # Drops a request that is past its deadline, call with _ready held
+        if request.deadline is None or time.monotonic() <= request.deadline:
+            return False
+        if queue is not None:
+            queue.remove(request)
+        self._stats[request.priority].expired += 1
+        request.finish(False)
+        return True
+
+    def _frame(self, request, queue=None):
+        # The request's packet if it can be pipelined, call with _ready held
+        if request.motor is None:
+            return None  # Only set-points are safe to resend
+        if request.frame is None:
+            try:
+                request.frame = self.roboclaw.Frame(
+                    request.name, request.address, *request.args)
+            except Exception as e:
+                # Arguments that can't be packed (struct.error): fail this
+                # request rather than the bus thread
+                if queue is not None:
+                    queue.remove(request)
+                request.finish(False, e)
+                return None
+        return request.frame
+
+    def _run(self):
+        while True:
+            batch = self._next()
+            results = [None] * len(batch)
+            error = None
+            try:
+                if len(batch) == 1:
+                    request = batch[0]
+                    results[0] = getattr(self.roboclaw, request.name)(
+                        request.address, *request.args)
+                else:
+                    results = self.roboclaw.WritePipelined(
+                        [request.frame for request in batch])
+            except Exception as e:
+                error = e
+            now = time.monotonic()
+            with self._ready:
+                for request in batch:
+                    self._stats[request.priority].add(now - request.queued)
+                    if len(batch) > 1:
+                        self._stats[request.priority].pipelined += 1
+            for request, result in zip(batch, results):
+                request.finish(result, error)
+
+
+class _Batch:
+    def __init__(self, bus):
+        self.bus = bus
+
+    def __enter__(self):
+        with self.bus._ready:
+            self.bus._batch_owner = threading.current_thread()
+
+    def __exit__(self, *exc):
+        with self.bus._ready:
+            if self.bus._batch_owner is threading.current_thread():
+                self.bus._batch_owner = None
+            self.bus._ready.notify()
+
+
+class RoboclawHandle:
+    'Roboclaw commands for one packet serial address on a shared bus'
+
+    def __init__(self, bus, address, priority=DRIVE, deadline=None, wait=True):
+        self.bus = bus
+        self.address = address
+        self.priority = priority
+        self.deadline = deadline
+        # False: commands are queued and return their request straight
+        # away, see _Request.poll
+        self.wait = wait
+
+    def __getattr__(self, name):
+        # handle.ForwardM1(64) -> Roboclaw.ForwardM1(address, 64) on the bus
+        if not callable(getattr(Roboclaw, name, None)):
+            raise AttributeError(name)
+
+        def command(*args):
+            return self.bus.call(name, self.address, *args,
+                                 priority=self.priority, deadline=self.deadline,
+                                 wait=self.wait)
+        return command
+
+
+def _setpoint_motor(name):
+    # Which motor(s) a set-point command drives, None for everything else
+    if not name.startswith(SETPOINT_PREFIXES):
+        return None
+    if any(word in name for word in BUFFERED_COMMANDS):
+        return None
+    if 'M1M2' in name:
+        return 'M1M2'
+    if 'M1' in name:
+        return 'M1'
+    if 'M2' in name:
+        return 'M2'
+    return None
+
+
+class _Request:
+    def __init__(self, name, address, args, priority, deadline):
+        self.name = name
+        self.address = address
+        self.args = args
+        self.priority = priority
+        self.motor = _setpoint_motor(name)
+        self.queued = time.monotonic()
+        self.deadline = None if deadline is None else self.queued + deadline
+        self.frame = None
+        self.followers = []
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+    def finish(self, result, error=None):
+        for request in [self] + self.followers:
+            request.result = result
+            request.error = error
+            request.done.set()
+
+    def poll(self):
+        # The result once finished (False on an error), None until then
+        if not self.done.is_set():
+            return None
+        return self.result if self.error is None else False
+
+    def wait(self):
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class _ClassStats:
+    def __init__(self):
+        self.count = 0
+        self.coalesced = 0
+        self.expired = 0
+        self.pipelined = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, latency):
+        self.count += 1
+        self.total += latency
+        self.max = max(self.max, latency)
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'coalesced': self.coalesced,
+            'expired': self.expired,
+            'pipelined': self.pipelined,
+            'mean_ms': self.total / self.count * 1000 if self.count else 0.0,
+            'max_ms': self.max * 1000,
+        }
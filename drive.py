@@ -0,0 +1,112 @@
+from math import ceil, copysign
+import time
+
+# Duty value that matches ForwardM1/BackwardM1 at their full value of 127
+MAX_DUTY = 32767
+
+
+class ResponseCurve:
+    'Raw stick value (0-255) to signed 7 bit motor command, via a table'
+
+    def __init__(self, lower_dead_zone=116, upper_dead_zone=134, expo=0.0,
+                 max_output=64, invert=False):
+        # Values from lower_dead_zone to upper_dead_zone inclusive are 0.
+        # Outside it the deflection is rescaled to 0-1 from the dead zone
+        # edge to the end of travel, shaped by expo (0 linear, 1 cubic) and
+        # scaled to max_output. Stick up (low values) is positive unless
+        # invert. max_output=64 is the halving the drive loop always had
+        if not 0 < lower_dead_zone <= upper_dead_zone < 255:
+            raise ValueError("Dead zone must be inside 0-255 with lower <= upper")
+        if not 0.0 <= expo <= 1.0:
+            raise ValueError("expo must be between 0 and 1")
+        if not 0 <= max_output <= 127:
+            raise ValueError("max_output must be between 0 and 127")
+        self.lower_dead_zone = lower_dead_zone
+        self.upper_dead_zone = upper_dead_zone
+        self.expo = expo
+        self.max_output = max_output
+        self.invert = invert
+        # Built once, a tick is then one index per stick
+        self.table = tuple(self._command(value) for value in range(256))
+
+    def __call__(self, value):
+        return self.table[value]
+
+    def _command(self, value):
+        if value < self.lower_dead_zone:
+            x = (self.lower_dead_zone - value) / self.lower_dead_zone
+        elif value > self.upper_dead_zone:
+            x = -(value - self.upper_dead_zone) / (255 - self.upper_dead_zone)
+        else:
+            return 0  # Dead zone
+        x = (1 - self.expo) * x + self.expo * x ** 3
+        # Round away from zero so the first step out of the dead zone moves
+        command = int(copysign(ceil(abs(x) * self.max_output - 1e-9), x))
+        return -command if self.invert else command
+
+
+def command_to_duty(command):
+    # Signed 7 bit command (-127..127) to a signed 16 bit duty cycle
+    return int(command * MAX_DUTY / 127)
+
+
+class TankDrive:
+    'Left/right track commands for one Roboclaw'
+
+    def __init__(self, roboclaw, combined=True, accel=None, keepalive=0.5):
+        # roboclaw is a bus.RoboclawHandle for the drive controller
+        self.roboclaw = roboclaw
+        # combined: one DutyM1M2 (or DutyAccelM1M2 if accel is set) packet
+        # per tick instead of separate M1 and M2 packets
+        self.combined = combined
+        self.accel = accel
+        # Seconds before an unchanged command is sent again. Keep it below
+        # the serial timeout set on the Roboclaw, None repeats every tick
+        self.keepalive = keepalive
+        self.packets_sent = 0
+        self.packets_saved = 0
+        self._last_command = None
+        self._last_sent = 0
+
+    def update(self, m1, m2):
+        # Send only when the command changed or the keepalive is due
+        now = time.monotonic()
+        if (self.keepalive is not None and (m1, m2) == self._last_command
+                and now - self._last_sent < self.keepalive):
+            self.packets_saved += self._packets_per_command()
+            return True
+        return self.send(m1, m2)
+
+    def send(self, m1, m2):
+        # m1, m2 are signed 7 bit commands, positive is ForwardMx
+        self.packets_sent += self._packets_per_command()
+        if not self.combined:
+            ok = self._send_separately(m1, m2)
+        elif self.accel is None:
+            ok = self.roboclaw.DutyM1M2(command_to_duty(m1),
+                                        command_to_duty(m2))
+        else:
+            ok = self.roboclaw.DutyAccelM1M2(
+                self.accel, command_to_duty(m1),
+                self.accel, command_to_duty(m2))
+        # A command that wasn't ACKed is retried on the next update
+        self._last_command = (m1, m2) if ok else None
+        self._last_sent = time.monotonic()
+        return ok
+
+    def stop(self):
+        return self.send(0, 0)
+
+    def _packets_per_command(self):
+        return 1 if self.combined else 2
+
+    def _send_separately(self, m1, m2):
+        if m1 >= 0:
+            ok1 = self.roboclaw.ForwardM1(m1)
+        else:
+            ok1 = self.roboclaw.BackwardM1(-m1)
+        if m2 >= 0:
+            ok2 = self.roboclaw.ForwardM2(m2)
+        else:
+            ok2 = self.roboclaw.BackwardM2(-m2)
+        return ok1 and ok2
@@ -0,0 +1,117 @@
+import struct
+import time
+
+from evdev import InputEvent
+
+# File layout: a header, then one 16 byte little endian record per evdev
+# event exactly as the kernel delivered it, SYN reports included
+MAGIC = b'ME72EVT\0'
+VERSION = 1
+HEADER = struct.Struct('<8sH')
+RECORD = struct.Struct('<qHHi')  # Timestamp in us, type, code, value
+
+
+class InputRecorder:
+    'Writes a controller event stream to a file for replay'
+
+    def __init__(self, path):
+        self.path = path
+        self.events = 0
+        self._file = open(path, 'wb')
+        self._file.write(HEADER.pack(MAGIC, VERSION))
+
+    def write(self, event):
+        self._file.write(RECORD.pack(event.sec * 1000000 + event.usec,
+                                     event.type, event.code, event.value))
+        self.events += 1
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+
+def record(events, path, duration=None):
+    # Records events (read_events(controller)) until duration seconds have
+    # passed or Ctrl-C. Returns the number of events written
+    recorder = InputRecorder(path)
+    end = None if duration is None else time.monotonic() + duration
+    try:
+        for event in events:
+            recorder.write(event)
+            if end is not None and time.monotonic() >= end:
+                break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        recorder.close()
+    return recorder.events
+
+
+def read_recording(path):
+    # (timestamp in us, type, code, value) for every recorded event
+    with open(path, 'rb') as f:
+        magic, version = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not an input recording")
+        if version != VERSION:
+            raise ValueError(f"{path} is recording version {version}, expected {VERSION}")
+        data = f.read()
+    # A record cut short by a crash is dropped
+    end = len(data) - len(data) % RECORD.size
+    return list(RECORD.iter_unpack(data[:end]))
+
+
+def replay(path, speed=1.0, restamp=True):
+    # Yields the recorded events as evdev InputEvents, paced like the
+    # original stream. speed=2 plays twice as fast, speed=0 as fast as
+    # possible. Pacing is against absolute deadlines, so a slow consumer
+    # doesn't stretch the whole replay. restamp gives each event the wall
+    # clock time it is yielded at, like the kernel would, so latency
+    # tracing works; otherwise the recorded timestamps are kept
+    records = read_recording(path)
+    if not records:
+        return
+    first = records[0][0]
+    start = time.perf_counter()
+    for timestamp, type, code, value in records:
+        if speed:
+            delay = start + (timestamp - first) / 1e6 / speed - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        if restamp:
+            timestamp = int(time.time() * 1e6)
+        yield InputEvent(timestamp // 1000000, timestamp % 1000000,
+                         type, code, value)
+
+
+def main():
+    # python inputlog.py record drive.evt [seconds]   record the controller
+    # python inputlog.py info drive.evt               summarise a recording
+    import sys
+
+    from evdev import ecodes
+
+    if len(sys.argv) >= 3 and sys.argv[1] == 'record':
+        from joystick import find_ps4_controller, read_events
+
+        controller = find_ps4_controller()
+        duration = float(sys.argv[3]) if len(sys.argv) > 3 else None
+        print(f"Recording {controller.name}, Ctrl-C to stop")
+        count = record(read_events(controller), sys.argv[2], duration)
+        print(f"{count} events written to {sys.argv[2]}")
+    elif len(sys.argv) == 3 and sys.argv[1] == 'info':
+        records = read_recording(sys.argv[2])
+        seconds = (records[-1][0] - records[0][0]) / 1e6 if records else 0.0
+        print(f"{len(records)} events over {seconds:.1f} s")
+        counts = {}
+        for timestamp, type, code, value in records:
+            counts[(type, code)] = counts.get((type, code), 0) + 1
+        for (type, code), count in sorted(counts.items()):
+            names = ecodes.bytype.get(type, {}).get(code, code)
+            print(f"{ecodes.EV.get(type, type)} {names}: {count}")
+    else:
+        sys.exit("usage: python inputlog.py record FILE [SECONDS] | info FILE")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+import array
+import select
+import time
+
+import evdev
+from evdev import InputDevice, InputEvent, ecodes
+
+
+def find_ps4_controller():
+    for path in evdev.list_devices():
+        device = InputDevice(path)
+        if "Wireless Controller" in device.name:
+            return device
+    raise RuntimeError("PS4 controller not found! Ensure it's connected.")
+
+
+def read_events(controller):
+    # Blocks on the controller's file descriptor with epoll instead of
+    # spinning on read_one(), so the input thread sleeps until the kernel
+    # has events and wakes as soon as they arrive
+    poller = select.epoll()
+    poller.register(controller.fd, select.EPOLLIN)
+    try:
+        while True:
+            poller.poll()
+            try:
+                for event in controller.read():
+                    yield event
+            except BlockingIOError:
+                continue  # Woken without a full event, wait again
+    finally:
+        poller.close()
+
+
+class TriggerToggle:
+    'Turns an analogue trigger into one toggle per full press'
+
+    def __init__(self, press=200, release=100):
+        # The trigger has to go above press to toggle, then back below
+        # release before it can toggle again, so a value hovering around
+        # one threshold doesn't toggle repeatedly
+        if not 0 <= release < press <= 255:
+            raise ValueError(f"Need 0 <= release < press <= 255, got {release}, {press}")
+        self.press = press
+        self.release = release
+        self.held = False
+        self.on = False
+
+    def update(self, value):
+        # Returns 1 on the event that crosses press (self.on has just
+        # flipped), 0 otherwise. Never blocks
+        if self.held:
+            if value < self.release:
+                self.held = False
+            return 0
+        if value > self.press:
+            self.held = True
+            self.on = not self.on
+            return 1
+        return 0
+
+
+# Every DS4 axis and button the kernel driver reports, in mailbox slot order
+AXES = (ecodes.ABS_X, ecodes.ABS_Y, ecodes.ABS_Z, ecodes.ABS_RX,
+        ecodes.ABS_RY, ecodes.ABS_RZ, ecodes.ABS_HAT0X, ecodes.ABS_HAT0Y)
+BUTTONS = (ecodes.BTN_SOUTH, ecodes.BTN_EAST, ecodes.BTN_NORTH,
+           ecodes.BTN_WEST, ecodes.BTN_TL, ecodes.BTN_TR, ecodes.BTN_TL2,
+           ecodes.BTN_TR2, ecodes.BTN_SELECT, ecodes.BTN_START,
+           ecodes.BTN_MODE, ecodes.BTN_THUMBL, ecodes.BTN_THUMBR)
+# (event type, code) -> slot
+SLOTS = {(ecodes.EV_ABS, code): slot for slot, code in enumerate(AXES)}
+SLOTS.update({(ecodes.EV_KEY, code): slot + len(AXES)
+              for slot, code in enumerate(BUTTONS)})
+# Sticks rest at the centre, triggers, hat and buttons at 0
+CENTRED = (ecodes.ABS_X, ecodes.ABS_Y, ecodes.ABS_RX, ecodes.ABS_RY)
+
+
+def _at_rest():
+    return array.array('i', [128 if code in CENTRED else 0 for code in AXES]
+                       + [0] * len(BUTTONS))
+
+
+class ControllerMailbox:
+    'Latest value of every axis and button, one writer, any number of readers'
+
+    def __init__(self):
+        self._values = _at_rest()
+        # Seqlock: odd while the writer is part way through an update
+        self._seq = 0
+
+    # Writer side, only ever the joystick thread
+    def write(self, slot, value):
+        self._seq += 1
+        self._values[slot] = value
+        self._seq += 1
+
+    def publish(self, values):
+        # Every slot at once, readers see all of a batch or none of it
+        self._seq += 1
+        self._values[:] = values
+        self._seq += 1
+
+    # Reader side
+    @property
+    def generation(self):
+        # Completed updates so far, compare with an older read to tell
+        # whether anything changed
+        return self._seq >> 1
+
+    def read(self):
+        # (generation, copy of every slot), never a half written update.
+        # Retries instead of taking a lock, the writer never waits
+        while True:
+            seq = self._seq
+            if not seq & 1:
+                values = self._values[:]
+                if self._seq == seq:
+                    return seq >> 1, values
+            time.sleep(0)
+
+    def get(self, type, code):
+        # One value, for code that doesn't need a consistent set
+        return self._values[SLOTS[(type, code)]]
+
+
+def device_report(device, now=None):
+    # The device's current value for every slot, as one report of events
+    # stamped now. Lets a reader catch up after SYN_DROPPED
+    if now is None:
+        now = time.time()
+    sec, usec = int(now), int(now % 1 * 1e6)
+    report = []
+    for code in AXES:
+        try:
+            value = device.absinfo(code).value
+        except OSError:
+            continue  # Not an axis this device has
+        report.append(InputEvent(sec, usec, ecodes.EV_ABS, code, value))
+    keys = set(device.active_keys())
+    for code in BUTTONS:
+        report.append(InputEvent(sec, usec, ecodes.EV_KEY, code,
+                                 int(code in keys)))
+    return report
+
+
+def read_batches(events, device=None):
+    # Groups an event stream into the kernel's reports: lists of events
+    # ending in SYN_REPORT. After SYN_DROPPED the kernel lost events, so
+    # everything up to the next SYN_REPORT is discarded. With the device
+    # the events come from, that SYN_REPORT is replaced by a report of the
+    # device's current state (device_report), so no press, release or
+    # stick move is lost. A replay has no device to ask
+    batch = []
+    dropped = False
+    for event in events:
+        if event.type != ecodes.EV_SYN:
+            batch.append(event)
+        elif event.code == ecodes.SYN_REPORT:
+            if dropped:
+                if device is not None:
+                    yield device_report(device)
+            elif batch:
+                yield batch
+            batch = []
+            dropped = False
+        elif event.code == ecodes.SYN_DROPPED:
+            dropped = True
+
+
+class ControllerState:
+    'Every DS4 axis and button, with event times and per-report edge flags'
+
+    __slots__ = ('values', 'times', 'time', 'changed', 'pressed',
+                 'released', 'mailbox')
+
+    def __init__(self, mailbox=None):
+        # Indexed by slot (SLOTS). mailbox, a ControllerMailbox, gets a
+        # copy of the values after every report
+        self.values = _at_rest()
+        self.times = array.array('d', bytes(8 * len(self.values)))
+        self.time = 0.0  # Timestamp of the last report
+        # Bit masks over the slots, for the last report only: any change,
+        # and buttons going down or up
+        self.changed = 0
+        self.pressed = 0
+        self.released = 0
+        self.mailbox = mailbox
+
+    def update(self, batch):
+        # One report from read_batches, in a single pass. Events for
+        # anything outside SLOTS (the touchpad, motion sensors) are skipped
+        values = self.values
+        times = self.times
+        changed = pressed = released = 0
+        for event in batch:
+            slot = SLOTS.get((event.type, event.code))
+            if slot is None:
+                continue
+            value = event.value
+            old = values[slot]
+            if value == old:
+                continue
+            bit = 1 << slot
+            changed |= bit
+            if event.type == ecodes.EV_KEY:
+                if not old:
+                    pressed |= bit
+                elif not value:
+                    released |= bit
+            values[slot] = value
+            times[slot] = event.sec + event.usec / 1e6
+        self.changed = changed
+        self.pressed = pressed
+        self.released = released
+        if batch:
+            self.time = batch[-1].sec + batch[-1].usec / 1e6
+        if changed and self.mailbox is not None:
+            self.mailbox.publish(values)
+        return changed
+
+    # Bit tests for the last report, slot is SLOTS[(type, code)]
+    def moved(self, slot):
+        return self.changed >> slot & 1
+
+    def went_down(self, slot):
+        return self.pressed >> slot & 1
+
+    def went_up(self, slot):
+        return self.released >> slot & 1
@@ -0,0 +1,125 @@
+import array
+import json
+import threading
+import time
+
+# Stages of a stick movement, each measured from the one before:
+#   stored:   evdev report timestamp -> handle_batch stored the values
+#   pickup:   stored -> send_motor_command read it
+#   ack:      pickup -> the Roboclaw ACKed the drive packet (_writechecksum)
+#   total:    evdev event timestamp -> ACK
+STAGES = ('stored', 'pickup', 'ack', 'total')
+
+# Upper edges, in milliseconds, of the histogram buckets. Anything slower
+# goes in the final '>' bucket
+BUCKETS_MS = (0.5, 1, 2, 5, 10, 20, 50, 100)
+
+MAX_SAMPLES = 100000  # Per stage, later samples are only counted
+
+
+class LatencyTracer:
+    'Follows stick events from the kernel timestamp to the Roboclaw ACK'
+
+    def __init__(self, address):
+        # address: the drive Roboclaw, only its ACKs finish a trace
+        self.address = address
+        self.superseded = 0  # Stored values replaced before the drive loop read them
+        self.unsent = 0  # Picked up but not sent (unchanged command)
+        self.lost = 0  # Sent but never ACKed
+        self._samples = {stage: array.array('d') for stage in STAGES}
+        self._lock = threading.Lock()
+        self._stored = None  # Newest trace waiting for the drive loop
+        self._inflight = None  # Trace whose packet is on the bus
+
+    # Each hook is called from the thread that owns that stage
+    def stored(self, event_time):
+        # handle_batch, right after a stick report is stored. Event times
+        # are CLOCK_REALTIME, so the first stage is measured with time.time()
+        trace = _Trace(event_time, time.time(), time.perf_counter())
+        with self._lock:
+            if self._stored is not None:
+                self.superseded += 1
+            self._stored = trace
+
+    def pickup(self):
+        # send_motor_command, after it read the stick values
+        with self._lock:
+            trace, self._stored = self._stored, None
+        if trace is not None:
+            trace.pickup = time.perf_counter()
+            self._inflight = trace
+        return trace
+
+    def ack(self, packet, when):
+        # Roboclaw.ack_hook, on the bus thread when a write is ACKed
+        trace = self._inflight
+        if trace is not None and packet[0] == self.address and trace.ack is None:
+            trace.ack = when
+
+    def finish(self, trace, sent):
+        # send_motor_command, after drive.update returned. sent is whether
+        # it put a packet on the bus
+        if trace is None:
+            return
+        self._inflight = None
+        if trace.ack is None:
+            if sent:
+                self.lost += 1
+            else:
+                self.unsent += 1
+            return
+        self._add('stored', trace.stored_wall - trace.event)
+        self._add('pickup', trace.pickup - trace.stored)
+        self._add('ack', trace.ack - trace.pickup)
+        self._add('total', trace.stored_wall - trace.event + trace.ack - trace.stored)
+
+    def histograms(self):
+        # Per stage: count, p50/p99/max in ms and the bucket counts
+        report = {}
+        labels = [f"<{edge}ms" for edge in BUCKETS_MS] + [f">{BUCKETS_MS[-1]}ms"]
+        for stage in STAGES:
+            samples = sorted(self._samples[stage])
+            buckets = [0] * len(labels)
+            for value in samples:
+                ms = value * 1000
+                for bucket, edge in enumerate(BUCKETS_MS):
+                    if ms < edge:
+                        break
+                else:
+                    bucket = len(BUCKETS_MS)
+                buckets[bucket] += 1
+            report[stage] = {
+                'count': len(samples),
+                'p50_ms': _percentile(samples, 50) * 1000,
+                'p99_ms': _percentile(samples, 99) * 1000,
+                'max_ms': samples[-1] * 1000 if samples else 0.0,
+                'histogram': dict(zip(labels, buckets)),
+            }
+        report['superseded'] = self.superseded
+        report['unsent'] = self.unsent
+        report['lost'] = self.lost
+        return report
+
+    def export(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.histograms(), f, indent=2)
+
+    def _add(self, stage, latency):
+        samples = self._samples[stage]
+        if len(samples) < MAX_SAMPLES:
+            samples.append(latency)
+
+
+class _Trace:
+    def __init__(self, event, stored_wall, stored):
+        self.event = event
+        self.stored_wall = stored_wall
+        self.stored = stored
+        self.pickup = None
+        self.ack = None
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
@@ -0,0 +1,140 @@
+import time
+
+# Upper edges, in microseconds, of the lateness histogram buckets. A tick
+# later than the last edge goes in the final '>' bucket
+JITTER_BUCKETS_US = (100, 250, 500, 1000, 2000, 5000, 10000)
+
+
+class FixedRateLoop:
+    'Paces a loop to absolute monotonic_ns deadlines and records its timing'
+
+    def __init__(self, period=0.02, wake=None, min_interval=0.0):
+        self.period_ns = int(period * 1e9)
+        # wake is an optional threading.Event: setting it runs the loop
+        # straight away (a stick moved) without moving the deadlines. No two
+        # passes run closer than min_interval: a wake that soon after the
+        # last pass waits, and a tick that soon after an early pass is
+        # skipped, so a stream of wakes can't run the loop at the input's
+        # rate
+        self.wake = wake
+        self.min_interval_ns = int(min_interval * 1e9)
+        self.ticks = 0  # Ticks started on their deadline
+        self.early = 0  # Extra ticks started by wake
+        self.deferred = 0  # Wakes held back by min_interval
+        self.skipped = 0  # Ticks dropped by min_interval after an early pass
+        self.overruns = 0  # Ticks whose work ran past the next deadline
+        self.jitter = [0] * (len(JITTER_BUCKETS_US) + 1)
+        self._deadline = None
+        self._last_tick = None
+        self._last_pass = None
+        self._period_total = 0
+        self._period_min = None
+        self._period_max = 0
+        self._io_tick = 0  # UART time of the tick in progress
+        self._io_total = 0
+        self._io_max = 0
+
+    def wait(self):
+        # Call at the end of every pass through the loop. Returns when the
+        # next deadline is due, or earlier if wake is set
+        now = time.monotonic_ns()
+        self._end_tick()
+        if self._deadline is None:
+            # The pass before the first wait counts as the first pass
+            self._deadline = now
+            self._last_pass = now
+        self._deadline += self.period_ns
+        if now > self._deadline:
+            # Skip the deadlines already missed rather than running a burst
+            # of back to back ticks to catch up
+            self.overruns += 1
+            missed = (now - self._deadline) // self.period_ns + 1
+            self._deadline += missed * self.period_ns
+        if (self._last_pass is not None
+                and self._deadline - self._last_pass < self.min_interval_ns):
+            # An early pass just ran, this tick would see the same input
+            self.skipped += 1
+            self._deadline += self.period_ns
+        while True:
+            remaining = self._deadline - time.monotonic_ns()
+            if remaining <= 0:
+                break
+            if self.wake is None:
+                time.sleep(remaining / 1e9)
+            elif self.wake.wait(remaining / 1e9):
+                if self._last_pass is not None:
+                    earliest = self._last_pass + self.min_interval_ns
+                    if earliest >= self._deadline:
+                        # The tick comes first and sees the same input
+                        self.deferred += 1
+                        self.wake.clear()
+                        time.sleep(max(0, self._deadline - time.monotonic_ns()) / 1e9)
+                        break
+                    delay = earliest - time.monotonic_ns()
+                    if delay > 0:
+                        self.deferred += 1
+                        time.sleep(delay / 1e9)
+                self.wake.clear()
+                self.early += 1
+                self._last_pass = time.monotonic_ns()
+                # Same deadline next time, this pass doesn't count as a tick
+                self._deadline -= self.period_ns
+                return
+        self._start_tick(time.monotonic_ns())
+
+    def io(self):
+        # with loop.io(): drive.update(...) counts the block as UART time
+        return _IoTimer(self)
+
+    def stats(self):
+        ticks = max(1, self.ticks - 1)
+        passes = max(1, self.ticks + self.early)
+        buckets = [f"<{edge}us" for edge in JITTER_BUCKETS_US]
+        buckets.append(f">{JITTER_BUCKETS_US[-1]}us")
+        return {
+            'ticks': self.ticks,
+            'early': self.early,
+            'deferred': self.deferred,
+            'skipped': self.skipped,
+            'overruns': self.overruns,
+            'period_ms': self._period_total / ticks / 1e6,
+            'period_min_ms': (self._period_min or 0) / 1e6,
+            'period_max_ms': self._period_max / 1e6,
+            'jitter': dict(zip(buckets, self.jitter)),
+            'io_ms': self._io_total / passes / 1e6,
+            'io_max_ms': self._io_max / 1e6,
+        }
+
+    def _start_tick(self, now):
+        self.ticks += 1
+        late = (now - self._deadline) // 1000
+        for bucket, edge in enumerate(JITTER_BUCKETS_US):
+            if late < edge:
+                break
+        else:
+            bucket = len(JITTER_BUCKETS_US)
+        self.jitter[bucket] += 1
+        if self._last_tick is not None:
+            period = now - self._last_tick
+            self._period_total += period
+            self._period_max = max(self._period_max, period)
+            if self._period_min is None or period < self._period_min:
+                self._period_min = period
+        self._last_tick = now
+        self._last_pass = now
+
+    def _end_tick(self):
+        self._io_total += self._io_tick
+        self._io_max = max(self._io_max, self._io_tick)
+        self._io_tick = 0
+
+
+class _IoTimer:
+    def __init__(self, loop):
+        self.loop = loop
+
+    def __enter__(self):
+        self.start = time.monotonic_ns()
+
+    def __exit__(self, *exc):
+        self.loop._io_tick += time.monotonic_ns() - self.start
@@ -0,0 +1,121 @@
+import math
+import os
+import struct
+import time
+
+# File layout: one header, then fixed-width little endian records appended
+# once per drive tick. A record cut short by a crash is ignored by the
+# reader.
+MAGIC = b'ME72LOG\0'
+VERSION = 1
+HEADER = struct.Struct('<8sHHd')  # magic, version, record size, start (Unix time)
+
+# (name, struct code, NumPy type) per record field. Measured values come
+# from the telemetry sampler and are NaN when there is none
+RECORD_FIELDS = (
+    ('time', 'd', '<f8'),  # Seconds since the start in the header
+    ('stick_left', 'B', 'u1'),  # Raw stick values, 128 is centre
+    ('stick_right', 'B', 'u1'),
+    ('duty1', 'h', '<i2'),  # Commanded duty, +-32767
+    ('duty2', 'h', '<i2'),
+    ('speed1', 'f', '<f4'),  # Encoder counts/s
+    ('speed2', 'f', '<f4'),
+    ('current1', 'f', '<f4'),  # A
+    ('current2', 'f', '<f4'),
+    ('battery', 'f', '<f4'),  # Main battery V
+    ('error', 'L', '<u4'),  # Roboclaw error bits, NO_ERROR if unknown
+)
+RECORD = struct.Struct('<' + ''.join(code for name, code, dtype in RECORD_FIELDS))
+NO_ERROR = 0xFFFFFFFF
+
+NAN = float('nan')
+
+
+class MatchLog:
+    'Append-only binary log of what the drive loop did'
+
+    def __init__(self, path, flush_interval=1.0):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        new = not os.path.exists(path) or os.path.getsize(path) == 0
+        self.path = path
+        # Records collect in the buffer and hit the disk every
+        # flush_interval seconds, or sooner if the buffer fills
+        self.flush_interval = flush_interval
+        self.records = 0
+        self._file = open(path, 'ab', buffering=64 * 1024)
+        if new:
+            self.start_time = time.time()
+            self._file.write(HEADER.pack(MAGIC, VERSION, RECORD.size,
+                                         self.start_time))
+        else:
+            self.start_time = read_header(path)[3]
+        # Record times are monotonic, offset to line up with start_time
+        self._start = time.monotonic() - (time.time() - self.start_time)
+        self._last_flush = time.monotonic()
+
+    def write(self, stick_left, stick_right, duty1, duty2, sample=None):
+        # sample is a telemetry.Sample, or None if nothing was measured
+        now = time.monotonic()
+        if sample is None:
+            measured = (NAN, NAN, NAN, NAN, NAN)
+            error = NO_ERROR
+        else:
+            measured = (sample.speed1, sample.speed2, sample.current1,
+                        sample.current2, sample.main_battery)
+            error = NO_ERROR if math.isnan(sample.error) else int(sample.error)
+        self._file.write(RECORD.pack(now - self._start, stick_left, stick_right,
+                                     duty1, duty2, *measured, error))
+        self.records += 1
+        if now - self._last_flush >= self.flush_interval:
+            self._file.flush()
+            self._last_flush = now
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+
+def read_header(path):
+    with open(path, 'rb') as f:
+        header = HEADER.unpack(f.read(HEADER.size))
+    if header[0] != MAGIC:
+        raise ValueError(f"{path} is not a match log")
+    if header[1] != VERSION or header[2] != RECORD.size:
+        raise ValueError(f"{path} is log version {header[1]}, expected {VERSION}")
+    return header
+
+
+def read_log(path):
+    # Memory maps the records as a NumPy structured array, log['speed1'] etc.
+    # are column views and nothing is copied until they are used. Returns
+    # (start time, records)
+    import numpy
+
+    start_time = read_header(path)[3]
+    dtype = numpy.dtype([(name, numpy_type)
+                         for name, code, numpy_type in RECORD_FIELDS])
+    count = (os.path.getsize(path) - HEADER.size) // dtype.itemsize
+    if count == 0:
+        return start_time, numpy.zeros(0, dtype)
+    records = numpy.memmap(path, dtype, mode='r', offset=HEADER.size,
+                           shape=(count,))
+    return start_time, records
+
+
+def main():
+    # python matchlog.py logs/match.bin, prints a summary of a log
+    import sys
+    import numpy
+
+    start_time, log = read_log(sys.argv[1])
+    print(f"Started {time.ctime(start_time)}, {len(log)} records, "
+          f"{log['time'][-1] if len(log) else 0:.1f} s")
+    for name, code, numpy_type in RECORD_FIELDS[1:-1]:
+        column = log[name]
+        if len(column):
+            print(f"{name:>12}: min {numpy.nanmin(column):10.2f}  "
+                  f"max {numpy.nanmax(column):10.2f}")
+
+
+if __name__ == "__main__":
+    main()
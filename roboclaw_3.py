@@ -1,18 +1,192 @@
+import collections
 import random
 import serial
 import struct
 import time
 
 
+def _crc16_table():
+    table = []
+    for byte in range(0, 256):
+        crc = byte << 8
+        for bit in range(0, 8):
+            if (crc & 0x8000) == 0x8000:
+                crc = ((crc << 1) ^ 0x1021) & 0xFFFF
+            else:
+                crc = (crc << 1) & 0xFFFF
+        table.append(crc)
+    return tuple(table)
+
+
+# CRC16-CCITT (poly 0x1021, init 0) lookup table, one entry per byte value
+CRC16_TABLE = _crc16_table()
+
+
+def crc16(data, crc=0):
+    # Checksum of a whole buffer, optionally continuing from a previous crc
+    table = CRC16_TABLE
+    for byte in data:
+        crc = ((crc << 8) & 0xFFFF) ^ table[(crc >> 8) ^ byte]
+    return crc
+
+
+# Raw units as the Roboclaw reports them: encoder counts, counts/s, 10 mA,
+# 0.1 V, 0.1 C. Fields that could not be read are None
+StatusSnapshot = collections.namedtuple('StatusSnapshot', (
+    'address', 'enc1', 'enc2', 'speed1', 'speed2', 'current1', 'current2',
+    'main_battery', 'temperature', 'error', 'duration'))
+
+
+def _snapshot(address, encoders, speed1, speed2, currents, battery,
+              temperature, error, duration):
+    # Builds the ReadStatusSnapshot result from _readframe results
+    reads = (encoders, speed1, speed2, currents, battery, temperature, error)
+    encoders = encoders or (0, None, None)
+    currents = currents or (0, None, None)
+    snapshot = StatusSnapshot(
+        address, encoders[1], encoders[2],
+        speed1[1] if speed1 else None, speed2[1] if speed2 else None,
+        currents[1], currents[2],
+        battery[1] if battery else None,
+        temperature[1] if temperature else None,
+        error[1] if error else None, duration)
+    return (int(all(reads)), snapshot)
+
+
+# Word and long fields are masked to their width like the original
+# _writeword/_writelong did, so 'l' also takes 2**31 and up (the same two's
+# complement bits) and 'L' takes negative values. Bytes are not masked
+_MASKS = {'h': 0xFFFF, 'H': 0xFFFF, 'l': 0xFFFFFFFF, 'L': 0xFFFFFFFF}
+
+
+def _pack(address, cmd, fmt, *vals):
+    # One write command's packet: address, command, payload and CRC
+    if fmt.strip('B'):
+        vals = [val & _MASKS[field] if field in _MASKS else val
+                for field, val in zip(fmt, vals)]
+        fmt = fmt.upper()
+    packet = struct.pack('>BB' + fmt, address, cmd, *vals)
+    return packet + struct.pack('>H', crc16(packet))
+
+
+def _confirmed(packets, start, acks, rate):
+    # How many of the pipelined packets written at start the ACK times in
+    # acks confirm, counting from the first
+    if len(acks) == len(packets):
+        return len(packets)
+    # Earliest moment each frame can have finished leaving the UART
+    byte_time = 10.0 / rate
+    ends = []
+    sent = 0
+    for packet in packets:
+        sent += len(packet)
+        ends.append(start + sent * byte_time)
+    # n ACKs in before frame n could have been sent can only belong to
+    # frames 0..n-1, those are confirmed. The rest are retried one by one
+    confirmed = 0
+    for n in range(1, len(acks) + 1):
+        if acks[n - 1] < ends[n]:
+            confirmed = n
+    return confirmed
+
+
+class TransportPolicy:
+    'Per-address read timeouts from measured round trips, plus retry backoff'
+
+    def __init__(self, timeout=0.01, retries=3, min_timeout=0.002,
+                 max_timeout=0.05, factor=3.0, window=64, backoff=0.001,
+                 max_backoff=0.008):
+        self.initial_timeout = timeout  # Used until an address has samples
+        self.retries = retries
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.factor = factor  # Timeout = factor * p99 round trip
+        self.window = window
+        self.backoff = backoff  # First retry delay, doubled per failure
+        self.max_backoff = max_backoff
+        self._addresses = {}
+
+    def timeout(self, address):
+        return self._address(address).timeout
+
+    def record(self, address, rtt):
+        # The first response byte arrived rtt seconds after the request
+        state = self._address(address)
+        state.rtts.append(rtt)
+        state.failures = 0
+        state.samples += 1
+        if state.samples % 16 == 0 and len(state.rtts) >= self.window // 4:
+            rtts = sorted(state.rtts)
+            p99 = rtts[min(len(rtts) - 1, len(rtts) * 99 // 100)]
+            state.timeout = max(self.min_timeout,
+                                min(self.max_timeout, p99 * self.factor))
+
+    def timed_out(self, address):
+        self._address(address).timeouts += 1
+
+    def retry(self, address):
+        # Seconds to wait before the next attempt
+        state = self._address(address)
+        state.retries += 1
+        state.failures += 1
+        return min(self.max_backoff, self.backoff * 2 ** (state.failures - 1))
+
+    def stats(self):
+        stats = {}
+        # Copies first, the bus thread may be recording meanwhile
+        for address, state in list(self._addresses.items()):
+            rtts = sorted(list(state.rtts))
+            stats[address] = {
+                'timeout_ms': state.timeout * 1000,
+                'rtt_p50_ms': rtts[len(rtts) // 2] * 1000 if rtts else 0.0,
+                'rtt_p99_ms': rtts[len(rtts) * 99 // 100] * 1000 if rtts else 0.0,
+                'retries': state.retries,
+                'timeouts': state.timeouts,
+            }
+        return stats
+
+    def _address(self, address):
+        state = self._addresses.get(address)
+        if state is None:
+            state = self._addresses[address] = _AddressState(
+                self.initial_timeout, self.window)
+        return state
+
+
+class _AddressState:
+    def __init__(self, timeout, window):
+        self.timeout = timeout
+        self.rtts = collections.deque(maxlen=window)
+        self.samples = 0
+        self.failures = 0
+        self.retries = 0
+        self.timeouts = 0
+
+
 class Roboclaw:
     'Roboclaw Interface Class'
 
-    def __init__(self, comport, rate, timeout=0.01, retries=3):
+    def __init__(self, comport, rate, timeout=None, retries=None, policy=None):
+        # timeout (default 0.01 s) and retries (default 3) build the
+        # TransportPolicy. A policy passed in already has its own
+        if policy is None:
+            policy = TransportPolicy(0.01 if timeout is None else timeout,
+                                     3 if retries is None else retries)
+        elif timeout is not None or retries is not None:
+            raise ValueError("Set timeout and retries on the TransportPolicy "
+                             "when passing policy")
         self.comport = comport
         self.rate = rate
-        self.timeout = timeout
-        self._trystimeout = retries
+        self.timeout = policy.initial_timeout
+        self.policy = policy
+        self._trystimeout = self.policy.retries
         self._crc = 0
+        self._address = None
+        self._start = None
+        self._wire = 0.0  # UART time of the current transaction's packet
+        # Called as ack_hook(packet, time.perf_counter()) for every ACKed
+        # write, on the thread that sent it (see latency.LatencyTracer)
+        self.ack_hook = None
 
     # Command Enums
     class Cmd():
@@ -88,6 +262,7 @@ class Roboclaw:
         GETPINFUNCTIONS = 75
         SETDEADBAND = 76
         GETDEADBAND = 77
+        GETENCODERS = 78
         RESTOREDEFAULTS = 80
         GETTEMP = 82
         GETTEMP2 = 83
@@ -115,26 +290,56 @@ class Roboclaw:
         return
 
     def crc_update(self, data):
-        self._crc = self._crc ^ (data << 8)
-        for bit in range(0, 8):
-            if (self._crc & 0x8000) == 0x8000:
-                self._crc = ((self._crc << 1) ^ 0x1021)
-            else:
-                self._crc = self._crc << 1
+        self._crc = ((self._crc << 8) & 0xFFFF) ^ \
+            CRC16_TABLE[(self._crc >> 8) ^ (data & 0xFF)]
         return
 
-    def _sendcommand(self, address, command):
-        self.crc_clear()
-        self.crc_update(address)
-# self._port.write(chr(address))
-        self._port.write(address.to_bytes(1, 'big'))
-        self.crc_update(command)
-# self._port.write(chr(command))
-        self._port.write(command.to_bytes(1, 'big'))
+    def _begin(self, packet):
+        # Start of a transaction: use the address's timeout and start timing.
+        # The timer runs while the packet is still leaving the UART, so its
+        # wire time is added to the timeout and taken off the round trip
+        self._wire = len(packet) * 10.0 / self.rate
+        self._settimeout(self.policy.timeout(packet[0]) + self._wire)
+        self._address = packet[0]
+        self._start = time.perf_counter()
+
+    def _settimeout(self, timeout):
+        # Setting it is a termios call, skip that when it barely changes
+        if abs(self._port.timeout - timeout) > 0.0005:
+            self._port.timeout = timeout
+
+    def _retry(self):
+        delay = self.policy.retry(self._address)
+        if delay:
+            time.sleep(delay)
+
+    def _portread(self, size):
+        data = self._port.read(size)
+        while 0 < len(data) < size:
+            # The timeout is sized for the turnaround, keep reading while
+            # the rest of a longer response is still arriving
+            chunk = self._port.read(size - len(data))
+            if not chunk:
+                break
+            data += chunk
+        if len(data) < size:
+            self.policy.timed_out(self._address)
+        elif self._start is not None:
+            # First read of the transaction, the Roboclaw's turnaround
+            self.policy.record(self._address, max(
+                0.0, time.perf_counter() - self._start - self._wire))
+            self._start = None
+        return data
+
+    def _sendcommand(self, address, command, data=b''):
+        packet = bytes((address, command)) + data
+        self._crc = crc16(packet)
+        self._begin(packet)
+        self._port.write(packet)
         return
 
     def _readchecksumword(self):
-        data = self._port.read(2)
+        data = self._portread(2)
         if len(data) == 2:
             # crc = (ord(data[0])<<8) | ord(data[1])
             crc = (data[0] << 8) | data[1]
@@ -142,7 +347,7 @@ class Roboclaw:
         return (0, 0)
 
     def _readbyte(self):
-        data = self._port.read(1)
+        data = self._portread(1)
         if len(data):
             val = ord(data)
             self.crc_update(val)
@@ -177,30 +382,6 @@ class Roboclaw:
             return (val[0], val[1])
         return (0, 0)
 
-    def _writebyte(self, val):
-        self.crc_update(val & 0xFF)
-# self._port.write(chr(val&0xFF))
-        self._port.write(val.to_bytes(1, 'big'))
-
-    def _writesbyte(self, val):
-        self._writebyte(val)
-
-    def _writeword(self, val):
-        self._writebyte((val >> 8) & 0xFF)
-        self._writebyte(val & 0xFF)
-
-    def _writesword(self, val):
-        self._writeword(val)
-
-    def _writelong(self, val):
-        self._writebyte((val >> 24) & 0xFF)
-        self._writebyte((val >> 16) & 0xFF)
-        self._writebyte((val >> 8) & 0xFF)
-        self._writebyte(val & 0xFF)
-
-    def _writeslong(self, val):
-        self._writelong(val)
-
     def _read1(self, address, cmd):
         trys = self._trystimeout
         while 1:
@@ -213,6 +394,7 @@ class Roboclaw:
                     if self._crc & 0xFFFF != crc[1] & 0xFFFF:
                         return (0, 0)
                     return (1, val1[1])
+            self._retry()
             trys -= 1
             if trys == 0:
                 break
@@ -230,6 +412,7 @@ class Roboclaw:
                     if self._crc & 0xFFFF != crc[1] & 0xFFFF:
                         return (0, 0)
                     return (1, val1[1])
+            self._retry()
             trys -= 1
             if trys == 0:
                 break
@@ -247,6 +430,7 @@ class Roboclaw:
                     if self._crc & 0xFFFF != crc[1] & 0xFFFF:
                         return (0, 0)
                     return (1, val1[1])
+            self._retry()
             trys -= 1
             if trys == 0:
                 break
@@ -266,6 +450,7 @@ class Roboclaw:
                         if self._crc & 0xFFFF != crc[1] & 0xFFFF:
                             return (0, 0)
                         return (1, val1[1], val2[1])
+            self._retry()
             trys -= 1
             if trys == 0:
                 break
@@ -275,380 +460,152 @@ class Roboclaw:
         trys = self._trystimeout
         while 1:
             self._port.flushInput()
-            trys -= 1
-            if trys == 0:
-                break
-            failed = False
             self._sendcommand(address, cmd)
             data = [1,]
             for i in range(0, args):
                 val = self._readlong()
                 if val[0] == 0:
-                    failed = True
                     break
                 data.append(val[1])
-            if failed:
-                continue
-            crc = self._readchecksumword()
-            if crc[0]:
-                if self._crc & 0xFFFF == crc[1] & 0xFFFF:
-                    return (data)
+            else:
+                crc = self._readchecksumword()
+                if crc[0]:
+                    if self._crc & 0xFFFF == crc[1] & 0xFFFF:
+                        return (data)
+            self._retry()
+            trys -= 1
+            if trys == 0:
+                break
         return (0, 0, 0, 0, 0)
 
-    def _writechecksum(self):
-        self._writeword(self._crc & 0xFFFF)
-        val = self._readbyte()
-        if (len(val) > 0):
-            if val[0]:
-                return True
-        return False
-
-    def _write0(self, address, cmd):
+    def _readframe(self, address, cmd, fmt, data=b''):
+        # (1, values...) once a response passes its CRC, None if none did
+        packet = bytes((address, cmd)) + data
+        size = struct.calcsize('>' + fmt) + 2
         trys = self._trystimeout
         while trys:
-            self._sendcommand(address, cmd)
-            if self._writechecksum():
-                return True
-            trys = trys-1
+            self._port.flushInput()
+            self._sendcommand(address, cmd, data)
+            response = self._portread(1)
+            if response:
+                response += self._portread(size - 1)
+            if len(response) == size:
+                crc = struct.unpack('>H', response[-2:])[0]
+                if crc16(packet + response[:-2]) == crc:
+                    return (1,) + struct.unpack('>' + fmt, response[:-2])
+            self._retry()
+            trys -= 1
+        return None
+
+    def _writechecksum(self, packet):
+        self._begin(packet)
+        self._port.write(packet)
+        if len(self._portread(1)) == 1:
+            if self.ack_hook is not None:
+                self.ack_hook(packet, time.perf_counter())
+            return True
         return False
 
-    def _write1(self, address, cmd, val):
+    def _writeframe(self, address, cmd, fmt, *vals):
+        # Address, command, payload and CRC go out in a single write
+        return self._sendframe(_pack(address, cmd, fmt, *vals))
+
+    def _sendframe(self, packet):
         trys = self._trystimeout
         while trys:
-            self._sendcommand(address, cmd)
-            self._writebyte(val)
-            if self._writechecksum():
+            if self._writechecksum(packet):
                 return True
+            self._retry()
             trys = trys-1
         return False
 
+    def _write0(self, address, cmd):
+        return self._writeframe(address, cmd, '')
+
+    def _write1(self, address, cmd, val):
+        return self._writeframe(address, cmd, 'B', val)
+
     def _write11(self, address, cmd, val1, val2):
-        trys = self._trystimeout
-        while trys:
-            self._sendcommand(address, cmd)
-            self._writebyte(val1)
-            self._writebyte(val2)
-            if self._writechecksum():
-                return True
-            trys = trys-1
-        return False
+        return self._writeframe(address, cmd, 'BB', val1, val2)
 
     def _write111(self, address, cmd, val1, val2, val3):
-        trys = self._trystimeout
-        while trys:
-            self._sendcommand(address, cmd)
-            self._writebyte(val1)
-            self._writebyte(val2)
-            self._writebyte(val3)
-            if self._writechecksum():
-                return True
-            trys = trys-1
-        return False
+        return self._writeframe(address, cmd, 'BBB', val1, val2, val3)
 
     def _write2(self, address, cmd, val):
-        trys = self._trystimeout
-        while trys:
-            self._sendcommand(address, cmd)
-            self._writeword(val)
-            if self._writechecksum():
-                return True
-            trys = trys-1
-        return False
+        return self._writeframe(address, cmd, 'H', val)
 
     def _writeS2(self, address, cmd, val):
-        trys = self._trystimeout
-        while trys:
-            self._sendcommand(address, cmd)
-            self._writesword(val)
-            if self._writechecksum():
-                return True
-            trys = trys-1
-        return False
+        return self._writeframe(address, cmd, 'h', val)
 
     def _write22(self, address, cmd, val1, val2):
-        trys = self._trystimeout
-        while trys:
-            self._sendcommand(address, cmd)
-            self._writeword(val1)
-            self._writeword(val2)
-            if self._writechecksum():
-                return True
-            trys = trys-1
-        return False
+        return self._writeframe(address, cmd, 'HH', val1, val2)
 
     def _writeS22(self, address, cmd, val1, val2):
-        trys = self._trystimeout
-        while trys:
-            self._sendcommand(address, cmd)
-            self._writesword(val1)
-            self._writeword(val2)
-            if self._writechecksum():
-                return True
-            trys = trys-1
-        return False
+        return self._writeframe(address, cmd, 'hH', val1, val2)
 
     def _writeS2S2(self, address, cmd, val1, val2):
-        trys = self._trystimeout
-        while trys:
-            self._sendcommand(address, cmd)
-            self._writesword(val1)
-            self._writesword(val2)
-            if self._writechecksum():
-                return True
-            trys = trys-1
-        return False
+        return self._writeframe(address, cmd, 'hh', val1, val2)
 
     def _writeS24(self, address, cmd, val1, val2):
-        trys = self._trystimeout
-        while trys:
-            self._sendcommand(address, cmd)
-            self._writesword(val1)
-            self._writelong(val2)
-            if self._writechecksum():
-                return True
-            trys = trys-1
-        return False
+        return self._writeframe(address, cmd, 'hL', val1, val2)
 
     def _writeS24S24(self, address, cmd, val1, val2, val3, val4):
-        trys = self._trystimeout
-        while trys:
-            self._sendcommand(address, cmd)
-            self._writesword(val1)
-            self._writelong(val2)
-            self._writesword(val3)
-            self._writelong(val4)
-            if self._writechecksum():
-                return True
-            trys = trys-1
-        return False
+        return self._writeframe(address, cmd, 'hLhL', val1, val2, val3, val4)
 
     def _write4(self, address, cmd, val):
-        trys = self._trystimeout
-        while trys:
-            self._sendcommand(address, cmd)
-            self._writelong(val)
-            if self._writechecksum():
-                return True
-            trys = trys-1
-        return False
+        return self._writeframe(address, cmd, 'L', val)
 
     def _writeS4(self, address, cmd, val):
-        trys = self._trystimeout
-        while trys:
-            self._sendcommand(address, cmd)
-            self._writeslong(val)
-            if self._writechecksum():
-                return True
-            trys = trys-1
-        return False
+        return self._writeframe(address, cmd, 'l', val)
 
     def _write44(self, address, cmd, val1, val2):
-        trys = self._trystimeout
-        while trys:
-            self._sendcommand(address, cmd)
-            self._writelong(val1)
-            self._writelong(val2)
-            if self._writechecksum():
-                return True
-            trys = trys-1
-        return False
+        return self._writeframe(address, cmd, 'LL', val1, val2)
 
     def _write4S4(self, address, cmd, val1, val2):
-        trys = self._trystimeout
-        while trys:
-            self._sendcommand(address, cmd)
-            self._writelong(val1)
-            self._writeslong(val2)
-            if self._writechecksum():
-                return True
-            trys = trys-1
-        return False
+        return self._writeframe(address, cmd, 'Ll', val1, val2)
 
     def _writeS4S4(self, address, cmd, val1, val2):
-        trys = self._trystimeout
-        while trys:
-            self._sendcommand(address, cmd)
-            self._writeslong(val1)
-            self._writeslong(val2)
-            if self._writechecksum():
-                return True
-            trys = trys-1
-        return False
+        return self._writeframe(address, cmd, 'll', val1, val2)
 
     def _write441(self, address, cmd, val1, val2, val3):
-        trys = self._trystimeout
-        while trys:
-            self._sendcommand(address, cmd)
-            self._writelong(val1)
-            self._writelong(val2)
-            self._writebyte(val3)
-            if self._writechecksum():
-                return True
-            trys = trys-1
-        return False
+        return self._writeframe(address, cmd, 'LLB', val1, val2, val3)
 
     def _writeS441(self, address, cmd, val1, val2, val3):
-        trys = self._trystimeout
-        while trys:
-            self._sendcommand(address, cmd)
-            self._writeslong(val1)
-            self._writelong(val2)
-            self._writebyte(val3)
-            if self._writechecksum():
-                return True
-            trys = trys-1
-        return False
+        return self._writeframe(address, cmd, 'lLB', val1, val2, val3)
 
     def _write4S4S4(self, address, cmd, val1, val2, val3):
-        trys = self._trystimeout
-        while trys:
-            self._sendcommand(address, cmd)
-            self._writelong(val1)
-            self._writeslong(val2)
-            self._writeslong(val3)
-            if self._writechecksum():
-                return True
-            trys = trys-1
-        return False
+        return self._writeframe(address, cmd, 'Lll', val1, val2, val3)
 
     def _write4S441(self, address, cmd, val1, val2, val3, val4):
-        trys = self._trystimeout
-        while trys:
-            self._sendcommand(address, cmd)
-            self._writelong(val1)
-            self._writeslong(val2)
-            self._writelong(val3)
-            self._writebyte(val4)
-            if self._writechecksum():
-                return True
-            trys = trys-1
-        return False
+        return self._writeframe(address, cmd, 'LlLB', val1, val2, val3, val4)
 
     def _write4444(self, address, cmd, val1, val2, val3, val4):
-        trys = self._trystimeout
-        while trys:
-            self._sendcommand(address, cmd)
-            self._writelong(val1)
-            self._writelong(val2)
-            self._writelong(val3)
-            self._writelong(val4)
-            if self._writechecksum():
-                return True
-            trys = trys-1
-        return False
+        return self._writeframe(address, cmd, 'LLLL', val1, val2, val3, val4)
 
     def _write4S44S4(self, address, cmd, val1, val2, val3, val4):
-        trys = self._trystimeout
-        while trys:
-            self._sendcommand(address, cmd)
-            self._writelong(val1)
-            self._writeslong(val2)
-            self._writelong(val3)
-            self._writeslong(val4)
-            if self._writechecksum():
-                return True
-            trys = trys-1
-        return False
+        return self._writeframe(address, cmd, 'LlLl', val1, val2, val3, val4)
 
     def _write44441(self, address, cmd, val1, val2, val3, val4, val5):
-        trys = self._trystimeout
-        while trys:
-            self._sendcommand(address, cmd)
-            self._writelong(val1)
-            self._writelong(val2)
-            self._writelong(val3)
-            self._writelong(val4)
-            self._writebyte(val5)
-            if self._writechecksum():
-                return True
-            trys = trys-1
-        return False
+        return self._writeframe(address, cmd, 'LLLLB', val1, val2, val3, val4, val5)
 
     def _writeS44S441(self, address, cmd, val1, val2, val3, val4, val5):
-        trys = self._trystimeout
-        while trys:
-            self._sendcommand(address, cmd)
-            self._writeslong(val1)
-            self._writelong(val2)
-            self._writeslong(val3)
-            self._writelong(val4)
-            self._writebyte(val5)
-            if self._writechecksum():
-                return True
-            trys = trys-1
-        return False
+        return self._writeframe(address, cmd, 'lLlLB', val1, val2, val3, val4, val5)
 
     def _write4S44S441(self, address, cmd, val1, val2, val3, val4, val5, val6):
-        trys = self._trystimeout
-        while trys:
-            self._sendcommand(address, cmd)
-            self._writelong(val1)
-            self._writeslong(val2)
-            self._writelong(val3)
-            self._writeslong(val4)
-            self._writelong(val5)
-            self._writebyte(val6)
-            if self._writechecksum():
-                return True
-            trys = trys-1
-        return False
+        return self._writeframe(address, cmd, 'LlLlLB', val1, val2, val3, val4, val5, val6)
 
     def _write4S444S441(self, address, cmd, val1, val2, val3, val4, val5, val6, val7):
-        trys = self._trystimeout
-        while trys:
-            self._sendcommand(self, address, cmd)
-            self._writelong(val1)
-            self._writeslong(val2)
-            self._writelong(val3)
-            self._writelong(val4)
-            self._writeslong(val5)
-            self._writelong(val6)
-            self._writebyte(val7)
-            if self._writechecksum():
-                return True
-            trys = trys-1
-        return False
+        return self._writeframe(address, cmd, 'LlLLlLB', val1, val2, val3, val4, val5, val6, val7)
 
     def _write4444444(self, address, cmd, val1, val2, val3, val4, val5, val6, val7):
-        trys = self._trystimeout
-        while trys:
-            self._sendcommand(address, cmd)
-            self._writelong(val1)
-            self._writelong(val2)
-            self._writelong(val3)
-            self._writelong(val4)
-            self._writelong(val5)
-            self._writelong(val6)
-            self._writelong(val7)
-            if self._writechecksum():
-                return True
-            trys = trys-1
-        return False
+        return self._writeframe(address, cmd, 'LLLLLLL', val1, val2, val3, val4, val5, val6, val7)
 
     def _write444444441(self, address, cmd, val1, val2, val3, val4, val5, val6, val7, val8, val9):
-        trys = self._trystimeout
-        while trys:
-            self._sendcommand(address, cmd)
-            self._writelong(val1)
-            self._writelong(val2)
-            self._writelong(val3)
-            self._writelong(val4)
-            self._writelong(val5)
-            self._writelong(val6)
-            self._writelong(val7)
-            self._writelong(val8)
-            self._writebyte(val9)
-            if self._writechecksum():
-                return True
-            trys = trys-1
-        return False
+        return self._writeframe(address, cmd, 'LLLLLLLLB', val1, val2, val3, val4, val5, val6, val7, val8, val9)
 
     # User accessible functions
     def SendRandomData(self, cnt):
-        for i in range(0, cnt):
-            byte = random.getrandbits(8)
-# self._port.write(chr(byte))
-            self._port.write(byte.to_bytes(1, 'big'))
+        self._port.write(bytes(random.getrandbits(8) for i in range(0, cnt)))
         return
 
     def ForwardM1(self, address, val):
@@ -716,7 +673,7 @@ class Roboclaw:
             str = ""
             passed = True
             for i in range(0, 48):
-                data = self._port.read(1)
+                data = self._portread(1)
                 if len(data):
                     val = ord(data)
                     self.crc_update(val)
@@ -732,8 +689,7 @@ class Roboclaw:
                 if crc[0]:
                     if self._crc & 0xFFFF == crc[1] & 0xFFFF:
                         return (1, str)
-                    else:
-                        time.sleep(0.01)
+            self._retry()
             trys -= 1
             if trys == 0:
                 break
@@ -759,11 +715,11 @@ class Roboclaw:
 
     def SetM1VelocityPID(self, address, p, i, d, qpps):
         # return self._write4444(address,self.Cmd.SETM1PID,long(d*65536),long(p*65536),long(i*65536),qpps)
-        return self._write4444(address, self.Cmd.SETM1PID, d*65536, p*65536, i*65536, qpps)
+        return self._write4444(address, self.Cmd.SETM1PID, int(d*65536), int(p*65536), int(i*65536), qpps)
 
     def SetM2VelocityPID(self, address, p, i, d, qpps):
         # return self._write4444(address,self.Cmd.SETM2PID,long(d*65536),long(p*65536),long(i*65536),qpps)
-        return self._write4444(address, self.Cmd.SETM2PID, d*65536, p*65536, i*65536, qpps)
+        return self._write4444(address, self.Cmd.SETM2PID, int(d*65536), int(p*65536), int(i*65536), qpps)
 
     def ReadISpeedM1(self, address):
         return self._read4_1(address, self.Cmd.GETM1ISPEED)
@@ -847,7 +803,7 @@ class Roboclaw:
         return (0, 0, 0)
 
     def SpeedAccelM1M2_2(self, address, accel1, speed1, accel2, speed2):
-        return self._write4S44S4(address, self.Cmd.MIXEDSPEED2ACCEL, accel, speed1, accel2, speed2)
+        return self._write4S44S4(address, self.Cmd.MIXEDSPEED2ACCEL, accel1, speed1, accel2, speed2)
 
     def SpeedAccelDistanceM1M2_2(self, address, accel1, speed1, distance1, accel2, speed2, distance2, buffer):
         return self._write4S444S441(address, self.Cmd.MIXEDSPEED2ACCELDIST, accel1, speed1, distance1, accel2, speed2, distance2, buffer)
@@ -903,11 +859,11 @@ class Roboclaw:
 
     def SetM1PositionPID(self, address, kp, ki, kd, kimax, deadzone, min, max):
         # return self._write4444444(address,self.Cmd.SETM1POSPID,long(kd*1024),long(kp*1024),long(ki*1024),kimax,deadzone,min,max)
-        return self._write4444444(address, self.Cmd.SETM1POSPID, kd*1024, kp*1024, ki*1024, kimax, deadzone, min, max)
+        return self._write4444444(address, self.Cmd.SETM1POSPID, int(kd*1024), int(kp*1024), int(ki*1024), kimax, deadzone, min, max)
 
     def SetM2PositionPID(self, address, kp, ki, kd, kimax, deadzone, min, max):
         # return self._write4444444(address,self.Cmd.SETM2POSPID,long(kd*1024),long(kp*1024),long(ki*1024),kimax,deadzone,min,max)
-        return self._write4444444(address, self.Cmd.SETM2POSPID, kd*1024, kp*1024, ki*1024, kimax, deadzone, min, max)
+        return self._write4444444(address, self.Cmd.SETM2POSPID, int(kd*1024), int(kp*1024), int(ki*1024), kimax, deadzone, min, max)
 
     def ReadM1PositionPID(self, address):
         data = self._read_n(address, self.Cmd.READM1POSPID, 7)
@@ -960,6 +916,7 @@ class Roboclaw:
                             if self._crc & 0xFFFF != crc[1] & 0xFFFF:
                                 return (0, 0)
                             return (1, val1[1], val2[1], val3[1])
+            self._retry()
             trys -= 1
             if trys == 0:
                 break
@@ -987,6 +944,23 @@ class Roboclaw:
     def ReadError(self, address):
         return self._read4(address, self.Cmd.GETERROR)
 
+    def ReadStatusSnapshot(self, address):
+        # Encoders, speeds, currents, main battery, temperature and error
+        # status read back to back as one transaction, both encoders and
+        # both currents with a single command each. Returns
+        # (1, StatusSnapshot), or (0, StatusSnapshot) if any read failed.
+        # duration is the seconds the burst held the port
+        start = time.perf_counter()
+        encoders = self._readframe(address, self.Cmd.GETENCODERS, 'll')
+        speed1 = self._readframe(address, self.Cmd.GETM1SPEED, 'lB')
+        speed2 = self._readframe(address, self.Cmd.GETM2SPEED, 'lB')
+        currents = self._readframe(address, self.Cmd.GETCURRENTS, 'hh')
+        battery = self._readframe(address, self.Cmd.GETMBATT, 'H')
+        temperature = self._readframe(address, self.Cmd.GETTEMP, 'H')
+        error = self._readframe(address, self.Cmd.GETERROR, 'L')
+        return _snapshot(address, encoders, speed1, speed2, currents, battery,
+                         temperature, error, time.perf_counter() - start)
+
     def ReadEncoderModes(self, address):
         val = self._read2(address, self.Cmd.GETENCODERMODE)
         if val[0]:
@@ -1044,9 +1018,8 @@ class Roboclaw:
         trys = self._trystimeout
         while 1:
             self._port.flushInput()
-            self._sendcommand(address, self.Cmd.READEEPROM)
-            self.crc_update(ee_address)
-            self._port.write(chr(ee_address))
+            self._sendcommand(address, self.Cmd.READEEPROM,
+                              bytes((ee_address,)))
             val1 = self._readword()
             if val1[0]:
                 crc = self._readchecksumword()
@@ -1054,6 +1027,7 @@ class Roboclaw:
                     if self._crc & 0xFFFF != crc[1] & 0xFFFF:
                         return (0, 0)
                     return (1, val1[1])
+            self._retry()
             trys -= 1
             if trys == 0:
                 break
@@ -1070,15 +1044,63 @@ class Roboclaw:
                 if val1[0]:
                     if val1[1] == 0xaa:
                         return True
+                self._retry()
                 trys -= 1
                 if trys == 0:
                     break
         return False
 
+    # Pipelining: write commands to different addresses sent back to back,
+    # ACKs matched in order. Only for commands that are safe to repeat
+    # (set-points), an unconfirmed frame is sent again on its own
+    def Frame(self, name, *args):
+        # The packet Roboclaw.<name>(*args) would send, None unless it is a
+        # plain write command. Runs on a _FramePacker, never this instance
+        packer = _FramePacker()
+        try:
+            getattr(packer, name)(*args)
+        except AttributeError:
+            return None  # Not a command, or a read reaching for the port
+        if len(packer.frames) != 1:
+            return None
+        return packer.frames[0]
+
+    def WritePipelined(self, packets):
+        # Sends every packet in one write and returns a True/False per packet
+        data = b''.join(packets)
+        self._settimeout(max(self.policy.timeout(packet[0]) for packet in packets)
+                         + len(data) * 10.0 / self.rate)
+        self._port.flushInput()
+        start = time.perf_counter()
+        self._port.write(data)
+        acks = []
+        while len(acks) < len(packets):
+            if len(self._port.read(1)) == 0:
+                break
+            acks.append(time.perf_counter())
+        confirmed = _confirmed(packets, start, acks, self.rate)
+        if self.ack_hook is not None:
+            for packet, ack in zip(packets[:confirmed], acks):
+                self.ack_hook(packet, ack)
+        return [True] * confirmed + [self._sendframe(packet)
+                                     for packet in packets[confirmed:]]
+
     def Open(self):
         try:
             self._port = serial.Serial(
-                port=self.comport, baudrate=self.rate, timeout=0.01, interCharTimeout=self.timeout)
+                port=self.comport, baudrate=self.rate, timeout=self.timeout, interCharTimeout=self.timeout)
         except:
             return 0
         return 1
+
+
+class _FramePacker(Roboclaw):
+    'Stands in for a Roboclaw to collect the packets a command would write'
+
+    def __init__(self):
+        # No port and no transport state, so reads fail with AttributeError
+        self.frames = []
+
+    def _writeframe(self, address, cmd, fmt, *vals):
+        self.frames.append(_pack(address, cmd, fmt, *vals))
+        return True
@@ -0,0 +1,287 @@
+import asyncio
+import random
+import struct
+import time
+
+import serial
+
+from roboclaw_3 import Roboclaw, _confirmed, _pack, _snapshot, crc16
+
+
+class AsyncRoboclaw(Roboclaw):
+    'asyncio version of the Roboclaw interface, every command is awaitable'
+
+    # Commands that only forward to a _writeN/_readN helper are inherited
+    # from Roboclaw unchanged: the helpers below are coroutines, so
+    # ForwardM1() etc. return awaitables. Commands that decode their result
+    # are redefined as coroutines here.
+
+    def __init__(self, comport, rate, timeout=None, retries=None,
+                 call_timeout=None, policy=None):
+        Roboclaw.__init__(self, comport, rate, timeout, retries, policy)
+        # Default limit for call(), in seconds, including all retries
+        self.call_timeout = call_timeout
+        self._lock = None
+
+    def Open(self):
+        try:
+            self._port = serial.Serial(
+                port=self.comport, baudrate=self.rate, timeout=0)
+        except:
+            return 0
+        self._lock = asyncio.Lock()
+        return 1
+
+    async def call(self, name, *args, timeout=None):
+        # await rc.call('ForwardM1', 0x80, 64, timeout=0.05)
+        if timeout is None:
+            timeout = self.call_timeout
+        return await asyncio.wait_for(getattr(self, name)(*args), timeout)
+
+    # Transport
+    async def _readable(self, timeout):
+        # Waits up to timeout seconds for the port to have data
+        loop = asyncio.get_running_loop()
+        ready = loop.create_future()
+        fd = self._port.fileno()
+
+        def wake():
+            if not ready.done():
+                ready.set_result(None)
+        loop.add_reader(fd, wake)
+        try:
+            await asyncio.wait_for(ready, timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            loop.remove_reader(fd)
+
+    async def _read(self, size):
+        # Reads size bytes, fewer if the line goes quiet for the address's
+        # timeout (see TransportPolicy)
+        timeout = self.policy.timeout(self._address) + self._wire
+        data = bytearray()
+        while len(data) < size:
+            chunk = self._port.read(size - len(data))
+            if chunk:
+                if self._start is not None:
+                    # First bytes of the response, the Roboclaw's turnaround
+                    # net of the time the request took to leave the UART
+                    self.policy.record(self._address, max(
+                        0.0, time.perf_counter() - self._start - self._wire))
+                    self._start = None
+                data += chunk
+            elif not await self._readable(timeout):
+                self.policy.timed_out(self._address)
+                break
+        return bytes(data)
+
+    async def _transaction(self, packet, size):
+        # One request/response exchange, never interleaved with another
+        async with self._lock:
+            self._port.reset_input_buffer()
+            self._address = packet[0]
+            self._wire = len(packet) * 10.0 / self.rate
+            self._start = time.perf_counter()
+            self._port.write(packet)
+            return await self._read(size)
+
+    async def _retry(self):
+        delay = self.policy.retry(self._address)
+        if delay:
+            await asyncio.sleep(delay)
+
+    async def _writechecksum(self, packet):
+        if len(await self._transaction(packet, 1)) == 1:
+            if self.ack_hook is not None:
+                self.ack_hook(packet, time.perf_counter())
+            return True
+        return False
+
+    async def _writeframe(self, address, cmd, fmt, *vals):
+        return await self._sendframe(_pack(address, cmd, fmt, *vals))
+
+    async def _sendframe(self, packet):
+        trys = self._trystimeout
+        while trys:
+            if await self._writechecksum(packet):
+                return True
+            await self._retry()
+            trys = trys-1
+        return False
+
+    # Pipelining, Frame is Roboclaw's: it never touches the port
+    async def WritePipelined(self, packets):
+        # Sends every packet in one write and returns a True/False per packet
+        async with self._lock:
+            self._port.reset_input_buffer()
+            data = b''.join(packets)
+            timeout = (max(self.policy.timeout(packet[0]) for packet in packets)
+                       + len(data) * 10.0 / self.rate)
+            start = time.perf_counter()
+            self._port.write(data)
+            acks = []
+            while len(acks) < len(packets):
+                chunk = self._port.read(len(packets) - len(acks))
+                if chunk:
+                    now = time.perf_counter()
+                    acks.extend([now] * len(chunk))
+                elif not await self._readable(timeout):
+                    break
+        confirmed = _confirmed(packets, start, acks, self.rate)
+        if self.ack_hook is not None:
+            for packet, ack in zip(packets[:confirmed], acks):
+                self.ack_hook(packet, ack)
+        results = [True] * confirmed
+        for packet in packets[confirmed:]:
+            results.append(await self._sendframe(packet))
+        return results
+
+    async def _readframe(self, address, cmd, fmt, data=b''):
+        # (1, values...) once a response passes its CRC, None if none did
+        packet = bytes((address, cmd)) + data
+        size = struct.calcsize('>' + fmt) + 2
+        trys = self._trystimeout
+        while trys:
+            response = await self._transaction(packet, size)
+            if len(response) == size:
+                crc = struct.unpack('>H', response[-2:])[0]
+                if crc16(packet + response[:-2]) == crc:
+                    return (1,) + struct.unpack('>' + fmt, response[:-2])
+            await self._retry()
+            trys -= 1
+        return None
+
+    async def _read1(self, address, cmd):
+        return await self._readframe(address, cmd, 'B') or (0, 0)
+
+    async def _read2(self, address, cmd):
+        return await self._readframe(address, cmd, 'H') or (0, 0)
+
+    async def _read4(self, address, cmd):
+        return await self._readframe(address, cmd, 'L') or (0, 0)
+
+    async def _read4_1(self, address, cmd):
+        return await self._readframe(address, cmd, 'lB') or (0, 0)
+
+    async def _read_n(self, address, cmd, args):
+        data = await self._readframe(address, cmd, 'L' * args)
+        if data:
+            return list(data)
+        return (0, 0, 0, 0, 0)
+
+    # User accessible functions that decode their result
+    async def SendRandomData(self, cnt):
+        async with self._lock:
+            self._port.write(bytes(random.getrandbits(8) for i in range(0, cnt)))
+
+    async def ReadVersion(self, address):
+        packet = bytes((address, self.Cmd.GETVERSION))
+        trys = self._trystimeout
+        while trys:
+            async with self._lock:
+                self._port.reset_input_buffer()
+                self._address = address
+                self._wire = len(packet) * 10.0 / self.rate
+                self._start = time.perf_counter()
+                self._port.write(packet)
+                version = bytearray()
+                while len(version) < 48:
+                    byte = await self._read(1)
+                    if not byte:
+                        break
+                    version += byte
+                    if byte == b'\0':
+                        break
+                crc = await self._read(2)
+            if version.endswith(b'\0') and len(crc) == 2:
+                if crc16(packet + version) == struct.unpack('>H', crc)[0]:
+                    return (1, version[:-1].decode('ascii', 'replace'))
+            await self._retry()
+            trys -= 1
+        return (0, 0)
+
+    async def ReadBuffers(self, address):
+        return await self._readframe(address, self.Cmd.GETBUFFERS, 'BB') or (0, 0, 0)
+
+    async def ReadPWMs(self, address):
+        return await self._readframe(address, self.Cmd.GETPWMS, 'hh') or (0, 0, 0)
+
+    async def ReadCurrents(self, address):
+        return await self._readframe(address, self.Cmd.GETCURRENTS, 'hh') or (0, 0, 0)
+
+    async def ReadM1VelocityPID(self, address):
+        return await self._read_pid(address, self.Cmd.READM1PID, 4, 65536.0)
+
+    async def ReadM2VelocityPID(self, address):
+        return await self._read_pid(address, self.Cmd.READM2PID, 4, 65536.0)
+
+    async def ReadMinMaxMainVoltages(self, address):
+        return await self._readframe(address, self.Cmd.GETMINMAXMAINVOLTAGES, 'HH') or (0, 0, 0)
+
+    async def ReadMinMaxLogicVoltages(self, address):
+        return await self._readframe(address, self.Cmd.GETMINMAXLOGICVOLTAGES, 'HH') or (0, 0, 0)
+
+    async def ReadM1PositionPID(self, address):
+        return await self._read_pid(address, self.Cmd.READM1POSPID, 7, 1024.0)
+
+    async def ReadM2PositionPID(self, address):
+        return await self._read_pid(address, self.Cmd.READM2POSPID, 7, 1024.0)
+
+    async def ReadPinFunctions(self, address):
+        return await self._readframe(address, self.Cmd.GETPINFUNCTIONS, 'BBB') or (0, 0)
+
+    async def GetDeadBand(self, address):
+        return await self._readframe(address, self.Cmd.GETDEADBAND, 'BB') or (0, 0, 0)
+
+    async def ReadStatusSnapshot(self, address):
+        start = time.perf_counter()
+        encoders = await self._readframe(address, self.Cmd.GETENCODERS, 'll')
+        speed1 = await self._readframe(address, self.Cmd.GETM1SPEED, 'lB')
+        speed2 = await self._readframe(address, self.Cmd.GETM2SPEED, 'lB')
+        currents = await self._readframe(address, self.Cmd.GETCURRENTS, 'hh')
+        battery = await self._readframe(address, self.Cmd.GETMBATT, 'H')
+        temperature = await self._readframe(address, self.Cmd.GETTEMP, 'H')
+        error = await self._readframe(address, self.Cmd.GETERROR, 'L')
+        return _snapshot(address, encoders, speed1, speed2, currents, battery,
+                         temperature, error, time.perf_counter() - start)
+
+    async def ReadEncoderModes(self, address):
+        return await self._readframe(address, self.Cmd.GETENCODERMODE, 'BB') or (0, 0, 0)
+
+    async def ReadM1MaxCurrent(self, address):
+        data = await self._readframe(address, self.Cmd.GETM1MAXCURRENT, 'LL')
+        return data[:2] if data else (0, 0)
+
+    async def ReadM2MaxCurrent(self, address):
+        data = await self._readframe(address, self.Cmd.GETM2MAXCURRENT, 'LL')
+        return data[:2] if data else (0, 0)
+
+    async def ReadEeprom(self, address, ee_address):
+        return await self._readframe(address, self.Cmd.READEEPROM, 'H',
+                                     bytes((ee_address,))) or (0, 0)
+
+    async def WriteEeprom(self, address, ee_address, ee_word):
+        retval = await self._write111(
+            address, self.Cmd.WRITEEEPROM, ee_address, ee_word >> 8, ee_word & 0xFF)
+        if retval == True:
+            trys = self._trystimeout
+            while trys:
+                async with self._lock:
+                    val = await self._read(1)
+                if val == b'\xaa':
+                    return True
+                await self._retry()
+                trys -= 1
+        return False
+
+    async def _read_pid(self, address, cmd, count, scale):
+        # Velocity and position PIDs send D, P, I first as fixed point
+        data = await self._read_n(address, cmd, count)
+        if data[0]:
+            data[1] /= scale
+            data[2] /= scale
+            data[3] /= scale
+            return data
+        return (0,) * (count + 1)
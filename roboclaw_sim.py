@@ -0,0 +1,483 @@
+# Software stand-in for the Roboclaws on the UART. Opens a pseudo-terminal
+# that speaks the same packet serial protocol as roboclaw_3.Roboclaw, so the
+# driver, the bus and the robot scripts can run without hardware.
+#
+#   python roboclaw_sim.py            # prints the pty path to open
+#   Roboclaw(sim.port, 38400).Open()  # from a script or benchmark
+
+import os
+import random
+import select
+import struct
+import threading
+import time
+import tty
+
+from roboclaw_3 import Roboclaw, crc16
+
+Cmd = Roboclaw.Cmd
+
+ACK = 0xFF
+MAX_DUTY = 32767
+# A gap this long between bytes starts a new packet, like the real board
+PACKET_TIMEOUT = 0.01
+RESPONSE_CHUNK = 8
+VERSION = b"USB Roboclaw 2x15a v4.1.34 (simulated)\n"
+
+# Payload after address and command for every write, in struct format
+WRITE_FORMATS = {
+    Cmd.M1FORWARD: 'B', Cmd.M1BACKWARD: 'B',
+    Cmd.SETMINMB: 'B', Cmd.SETMAXMB: 'B',
+    Cmd.M2FORWARD: 'B', Cmd.M2BACKWARD: 'B',
+    Cmd.M17BIT: 'B', Cmd.M27BIT: 'B',
+    Cmd.MIXEDFORWARD: 'B', Cmd.MIXEDBACKWARD: 'B',
+    Cmd.MIXEDRIGHT: 'B', Cmd.MIXEDLEFT: 'B',
+    Cmd.MIXEDFB: 'B', Cmd.MIXEDLR: 'B',
+    Cmd.RESETENC: '',
+    Cmd.SETM1ENCCOUNT: 'L', Cmd.SETM2ENCCOUNT: 'L',
+    Cmd.SETMINLB: 'B', Cmd.SETMAXLB: 'B',
+    Cmd.SETM1PID: 'LLLL', Cmd.SETM2PID: 'LLLL',
+    Cmd.M1DUTY: 'h', Cmd.M2DUTY: 'h', Cmd.MIXEDDUTY: 'hh',
+    Cmd.M1SPEED: 'l', Cmd.M2SPEED: 'l', Cmd.MIXEDSPEED: 'll',
+    Cmd.M1SPEEDACCEL: 'Ll', Cmd.M2SPEEDACCEL: 'Ll',
+    Cmd.MIXEDSPEEDACCEL: 'Lll',
+    Cmd.M1SPEEDDIST: 'lLB', Cmd.M2SPEEDDIST: 'lLB',
+    Cmd.MIXEDSPEEDDIST: 'lLlLB',
+    Cmd.M1SPEEDACCELDIST: 'LlLB', Cmd.M2SPEEDACCELDIST: 'LlLB',
+    Cmd.MIXEDSPEEDACCELDIST: 'LlLlLB',
+    Cmd.MIXEDSPEED2ACCEL: 'LlLl',
+    Cmd.MIXEDSPEED2ACCELDIST: 'LlLLlLB',
+    Cmd.M1DUTYACCEL: 'hL', Cmd.M2DUTYACCEL: 'hL',
+    Cmd.MIXEDDUTYACCEL: 'hLhL',
+    Cmd.SETMAINVOLTAGES: 'HH', Cmd.SETLOGICVOLTAGES: 'HH',
+    Cmd.SETM1POSPID: 'LLLLLLL', Cmd.SETM2POSPID: 'LLLLLLL',
+    Cmd.M1SPEEDACCELDECCELPOS: 'LLLLB', Cmd.M2SPEEDACCELDECCELPOS: 'LLLLB',
+    Cmd.MIXEDSPEEDACCELDECCELPOS: 'LLLLLLLLB',
+    Cmd.SETM1DEFAULTACCEL: 'L', Cmd.SETM2DEFAULTACCEL: 'L',
+    Cmd.SETPINFUNCTIONS: 'BBB', Cmd.SETDEADBAND: 'BB',
+    Cmd.RESTOREDEFAULTS: '',
+    Cmd.SETM1ENCODERMODE: 'B', Cmd.SETM2ENCODERMODE: 'B',
+    Cmd.WRITENVM: 'L', Cmd.READNVM: '',
+    Cmd.SETCONFIG: 'H',
+    Cmd.SETM1MAXCURRENT: 'LL', Cmd.SETM2MAXCURRENT: 'LL',
+    Cmd.SETPWMMODE: 'B',
+    Cmd.WRITEEEPROM: 'BBB',
+    Cmd.FLAGBOOTLOADER: '',
+}
+
+# Reads whose request carries payload bytes (and no CRC) after the command
+READ_ARGUMENTS = {Cmd.READEEPROM: 1}
+
+
+def _wrap32(value):
+    # Encoder counts wrap like the 32 bit counter on the board
+    value = int(value) & 0xFFFFFFFF
+    return value - 0x100000000 if value & 0x80000000 else value
+
+
+class SimMotor:
+    'One simulated motor channel'
+
+    def __init__(self, max_speed, accel):
+        self.max_speed = max_speed  # qpps at full duty
+        self.accel = accel  # qpps/s used when a command gives none
+        self.speed = 0.0
+        self.target = 0.0
+        self.rate = accel
+        self.position = 0.0
+        self.default_accel = 0
+        self.max_current = 0
+
+    def set_duty(self, duty, accel=None):
+        # accel is a Roboclaw duty acceleration (duty units per second).
+        # Without one, the Set Default Accel value applies if it was set
+        if accel is None and self.default_accel:
+            accel = self.default_accel
+        self.set_speed(duty / MAX_DUTY * self.max_speed,
+                       None if accel is None else accel / MAX_DUTY * self.max_speed)
+
+    def set_speed(self, speed, accel=None):
+        self.target = max(-self.max_speed, min(self.max_speed, speed))
+        self.rate = self.accel if not accel else accel
+
+    def step(self, dt):
+        start = self.speed
+        change = self.rate * dt
+        if self.speed < self.target:
+            self.speed = min(self.target, self.speed + change)
+        elif self.speed > self.target:
+            self.speed = max(self.target, self.speed - change)
+        self.position += (start + self.speed) / 2 * dt
+
+    @property
+    def duty(self):
+        return int(self.speed / self.max_speed * MAX_DUTY)
+
+    @property
+    def current(self):
+        # 10 mA units: a no-load draw plus a share for duty and acceleration
+        load = abs(self.duty) / MAX_DUTY
+        accelerating = 0.5 if self.speed != self.target else 0.0
+        return int(50 + 900 * load + 600 * accelerating)
+
+
+class SimRoboclaw:
+    'State of one simulated Roboclaw at a packet serial address'
+
+    def __init__(self, address, max_speed=3000, accel=6000):
+        self.address = address
+        self.m1 = SimMotor(max_speed, accel)
+        self.m2 = SimMotor(max_speed, accel)
+        self.main_battery = 120  # Tenths of a volt
+        self.logic_battery = 50
+        self.temperature = 250  # Tenths of a degree C
+        self.temperature2 = 250
+        self.error = 0
+        self.config = 0x8063  # Packet serial, 38400 baud
+        self.pwm_mode = 1
+        self.deadband = (0, 0)
+        self.pin_functions = (0, 0, 0)
+        self.encoder_modes = (0, 0)
+        self.main_voltages = (60, 340)
+        self.logic_voltages = (60, 340)
+        self.velocity_pid = {1: (0, 0, 0, 0), 2: (0, 0, 0, 0)}
+        self.position_pid = {1: (0,) * 7, 2: (0,) * 7}
+        self.eeprom = {}
+        self._last_step = time.monotonic()
+
+    def step(self):
+        now = time.monotonic()
+        dt = now - self._last_step
+        self._last_step = now
+        self.m1.step(dt)
+        self.m2.step(dt)
+
+    def write(self, cmd, vals):
+        # Applies a write command, the CRC has already been checked
+        self.step()
+        m1, m2 = self.m1, self.m2
+        if cmd in (Cmd.M1FORWARD, Cmd.M2FORWARD, Cmd.M1BACKWARD, Cmd.M2BACKWARD):
+            motor = m1 if cmd in (Cmd.M1FORWARD, Cmd.M1BACKWARD) else m2
+            sign = 1 if cmd in (Cmd.M1FORWARD, Cmd.M2FORWARD) else -1
+            motor.set_duty(sign * min(vals[0], 127) * MAX_DUTY // 127)
+        elif cmd in (Cmd.M17BIT, Cmd.M27BIT):
+            motor = m1 if cmd == Cmd.M17BIT else m2
+            motor.set_duty((min(vals[0], 127) - 64) * MAX_DUTY // 63)
+        elif cmd == Cmd.M1DUTY:
+            m1.set_duty(vals[0])
+        elif cmd == Cmd.M2DUTY:
+            m2.set_duty(vals[0])
+        elif cmd == Cmd.MIXEDDUTY:
+            m1.set_duty(vals[0])
+            m2.set_duty(vals[1])
+        elif cmd == Cmd.M1DUTYACCEL:
+            m1.set_duty(vals[0], vals[1])
+        elif cmd == Cmd.M2DUTYACCEL:
+            m2.set_duty(vals[0], vals[1])
+        elif cmd == Cmd.MIXEDDUTYACCEL:
+            m1.set_duty(vals[0], vals[1])
+            m2.set_duty(vals[2], vals[3])
+        elif cmd == Cmd.M1SPEED:
+            m1.set_speed(vals[0])
+        elif cmd == Cmd.M2SPEED:
+            m2.set_speed(vals[0])
+        elif cmd == Cmd.MIXEDSPEED:
+            m1.set_speed(vals[0])
+            m2.set_speed(vals[1])
+        elif cmd == Cmd.M1SPEEDACCEL:
+            m1.set_speed(vals[1], vals[0])
+        elif cmd == Cmd.M2SPEEDACCEL:
+            m2.set_speed(vals[1], vals[0])
+        elif cmd == Cmd.MIXEDSPEEDACCEL:
+            m1.set_speed(vals[1], vals[0])
+            m2.set_speed(vals[2], vals[0])
+        elif cmd == Cmd.MIXEDSPEED2ACCEL:
+            m1.set_speed(vals[1], vals[0])
+            m2.set_speed(vals[3], vals[2])
+        elif cmd in (Cmd.M1SPEEDDIST, Cmd.M1SPEEDACCELDIST,
+                     Cmd.M2SPEEDDIST, Cmd.M2SPEEDACCELDIST):
+            # Distance moves are modelled as plain speed commands
+            motor = m1 if cmd in (Cmd.M1SPEEDDIST, Cmd.M1SPEEDACCELDIST) else m2
+            if cmd in (Cmd.M1SPEEDDIST, Cmd.M2SPEEDDIST):
+                motor.set_speed(vals[0])
+            else:
+                motor.set_speed(vals[1], vals[0])
+        elif cmd == Cmd.MIXEDSPEEDDIST:
+            m1.set_speed(vals[0])
+            m2.set_speed(vals[2])
+        elif cmd == Cmd.MIXEDSPEEDACCELDIST:
+            m1.set_speed(vals[1], vals[0])
+            m2.set_speed(vals[3], vals[0])
+        elif cmd == Cmd.MIXEDSPEED2ACCELDIST:
+            m1.set_speed(vals[1], vals[0])
+            m2.set_speed(vals[4], vals[3])
+        elif cmd == Cmd.RESETENC:
+            m1.position = m2.position = 0.0
+        elif cmd == Cmd.SETM1ENCCOUNT:
+            m1.position = float(vals[0])
+        elif cmd == Cmd.SETM2ENCCOUNT:
+            m2.position = float(vals[0])
+        elif cmd == Cmd.SETM1DEFAULTACCEL:
+            m1.default_accel = vals[0]
+        elif cmd == Cmd.SETM2DEFAULTACCEL:
+            m2.default_accel = vals[0]
+        elif cmd == Cmd.SETM1PID:
+            self.velocity_pid[1] = vals
+        elif cmd == Cmd.SETM2PID:
+            self.velocity_pid[2] = vals
+        elif cmd == Cmd.SETM1POSPID:
+            self.position_pid[1] = vals
+        elif cmd == Cmd.SETM2POSPID:
+            self.position_pid[2] = vals
+        elif cmd == Cmd.SETMAINVOLTAGES:
+            self.main_voltages = vals
+        elif cmd == Cmd.SETLOGICVOLTAGES:
+            self.logic_voltages = vals
+        elif cmd == Cmd.SETPINFUNCTIONS:
+            self.pin_functions = vals
+        elif cmd == Cmd.SETDEADBAND:
+            self.deadband = vals
+        elif cmd == Cmd.SETM1ENCODERMODE:
+            self.encoder_modes = (vals[0], self.encoder_modes[1])
+        elif cmd == Cmd.SETM2ENCODERMODE:
+            self.encoder_modes = (self.encoder_modes[0], vals[0])
+        elif cmd == Cmd.SETCONFIG:
+            self.config = vals[0]
+        elif cmd == Cmd.SETM1MAXCURRENT:
+            m1.max_current = vals[0]
+        elif cmd == Cmd.SETM2MAXCURRENT:
+            m2.max_current = vals[0]
+        elif cmd == Cmd.SETPWMMODE:
+            self.pwm_mode = vals[0]
+        elif cmd == Cmd.WRITEEEPROM:
+            self.eeprom[vals[0]] = vals[1] << 8 | vals[2]
+        # Battery limits, mixed mode, NVM and bootloader commands are ACKed
+        # and otherwise ignored
+
+    def read(self, cmd, args=b''):
+        # Response payload for a read command, None if it isn't one
+        self.step()
+        m1, m2 = self.m1, self.m2
+        status = 0
+        if cmd in (Cmd.GETM1ENC, Cmd.GETM2ENC):
+            motor = m1 if cmd == Cmd.GETM1ENC else m2
+            if motor.speed < 0:
+                status |= 0x02  # Direction bit
+            return struct.pack('>lB', _wrap32(motor.position), status)
+        if cmd == Cmd.GETENCODERS:
+            return struct.pack('>ll', _wrap32(m1.position), _wrap32(m2.position))
+        if cmd in (Cmd.GETM1SPEED, Cmd.GETM2SPEED, Cmd.GETM1ISPEED, Cmd.GETM2ISPEED):
+            motor = m1 if cmd in (Cmd.GETM1SPEED, Cmd.GETM1ISPEED) else m2
+            return struct.pack('>lB', int(motor.speed), int(motor.speed < 0))
+        if cmd == Cmd.GETVERSION:
+            return VERSION + b'\0'
+        if cmd == Cmd.GETMBATT:
+            return struct.pack('>H', self.main_battery)
+        if cmd == Cmd.GETLBATT:
+            return struct.pack('>H', self.logic_battery)
+        if cmd == Cmd.GETBUFFERS:
+            return struct.pack('>BB', 0x80, 0x80)  # Both buffers empty
+        if cmd == Cmd.GETPWMS:
+            return struct.pack('>hh', m1.duty, m2.duty)
+        if cmd == Cmd.GETCURRENTS:
+            return struct.pack('>hh', m1.current, m2.current)
+        if cmd in (Cmd.READM1PID, Cmd.READM2PID):
+            pid = self.velocity_pid[1 if cmd == Cmd.READM1PID else 2]
+            return struct.pack('>LLLL', *pid)
+        if cmd in (Cmd.READM1POSPID, Cmd.READM2POSPID):
+            pid = self.position_pid[1 if cmd == Cmd.READM1POSPID else 2]
+            return struct.pack('>LLLLLLL', *pid)
+        if cmd == Cmd.GETMINMAXMAINVOLTAGES:
+            return struct.pack('>HH', *self.main_voltages)
+        if cmd == Cmd.GETMINMAXLOGICVOLTAGES:
+            return struct.pack('>HH', *self.logic_voltages)
+        if cmd == Cmd.GETPINFUNCTIONS:
+            return struct.pack('>BBB', *self.pin_functions)
+        if cmd == Cmd.GETDEADBAND:
+            return struct.pack('>BB', *self.deadband)
+        if cmd == Cmd.GETTEMP:
+            return struct.pack('>H', self.temperature)
+        if cmd == Cmd.GETTEMP2:
+            return struct.pack('>H', self.temperature2)
+        if cmd == Cmd.GETERROR:
+            return struct.pack('>L', self.error)
+        if cmd == Cmd.GETENCODERMODE:
+            return struct.pack('>BB', *self.encoder_modes)
+        if cmd == Cmd.GETCONFIG:
+            return struct.pack('>H', self.config)
+        if cmd == Cmd.GETM1MAXCURRENT:
+            return struct.pack('>LL', m1.max_current, 0)
+        if cmd == Cmd.GETM2MAXCURRENT:
+            return struct.pack('>LL', m2.max_current, 0)
+        if cmd == Cmd.GETPWMMODE:
+            return struct.pack('>B', self.pwm_mode)
+        if cmd == Cmd.READEEPROM:
+            return struct.pack('>H', self.eeprom.get(args[0], 0))
+        return None
+
+
+class RoboclawSimulator:
+    'Simulated Roboclaws behind a pseudo-terminal'
+
+    def __init__(self, addresses=(0x80, 0x82), baud=38400, latency=0.0,
+                 drop_rate=0.0, corrupt_rate=0.0, max_speed=3000, accel=6000,
+                 seed=None):
+        self.devices = {address: SimRoboclaw(address, max_speed, accel)
+                        for address in addresses}
+        # Responses are held back for the time the bytes would take on the
+        # wire at this baud rate, None replies as fast as possible
+        self.baud = baud
+        self.latency = latency  # Extra seconds before every response
+        # Faults, both ways: a request that loses a byte is ignored whole
+        # and a corrupted write fails its CRC, so the board stays silent
+        self.drop_rate = drop_rate  # Chance each byte on the wire is lost
+        self.corrupt_rate = corrupt_rate  # Chance a packet's CRC is wrong
+        self.random = random.Random(seed)
+        self.packets = 0
+        self.crc_errors = 0
+        self.dropped_bytes = 0  # From responses
+        self.dropped_packets = 0  # Requests that lost a byte
+        self.corrupted = 0  # Responses and requests
+        self.port = None
+        self._master = None
+        self._slave = None
+        self._running = False
+        self._thread = None
+        # When the bytes handled so far would have finished arriving at
+        # baud, so a packet behind others in one write is answered late
+        self._received = 0.0
+
+    def start(self):
+        # Opens the pty and returns the device path for Roboclaw(port, rate)
+        self._master, self._slave = os.openpty()
+        tty.setraw(self._slave)
+        self.port = os.ttyname(self._slave)
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self.port
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+        os.close(self._master)
+        os.close(self._slave)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _run(self):
+        buf = bytearray()
+        while self._running:
+            ready, _, _ = select.select([self._master], [], [], PACKET_TIMEOUT)
+            if not ready:
+                buf.clear()  # Inter-byte timeout, resync on the next byte
+                continue
+            buf += os.read(self._master, 256)
+            self._received = max(self._received, time.perf_counter())
+            while buf:
+                used = self._packet(buf)
+                if used == 0:
+                    break  # Wait for the rest of the packet
+                del buf[:used]
+                if self.baud:
+                    self._received += used * 10 / self.baud
+
+    def _packet(self, buf):
+        # Handles one packet at the start of buf and returns its length, or
+        # 0 if more bytes are needed
+        if len(buf) < 2:
+            return 0
+        address, cmd = buf[0], buf[1]
+        device = self.devices.get(address)
+        if cmd in WRITE_FORMATS:
+            size = 2 + struct.calcsize('>' + WRITE_FORMATS[cmd]) + 2
+            if len(buf) < size:
+                return 0
+            packet = bytes(buf[:size])
+            if device is None:
+                return size  # Another board on the chain
+            self.packets += 1
+            if self._lost(size):
+                return size
+            if self.corrupt_rate and self.random.random() < self.corrupt_rate:
+                packet = packet[:-1] + bytes((packet[-1] ^ 0x01,))
+                self.corrupted += 1
+            if crc16(packet[:-2]) != struct.unpack('>H', packet[-2:])[0]:
+                self.crc_errors += 1
+                return size  # The real board stays silent on a bad CRC
+            device.write(cmd, struct.unpack('>' + WRITE_FORMATS[cmd], packet[2:-2]))
+            self._respond(packet, bytes((ACK,)))
+            return size
+        size = 2 + READ_ARGUMENTS.get(cmd, 0)
+        if len(buf) < size:
+            return 0
+        if device is None:
+            return size
+        packet = bytes(buf[:size])
+        payload = device.read(cmd, packet[2:])
+        if payload is None:
+            return 1  # Not a command we know, skip a byte and resync
+        self.packets += 1
+        if self._lost(size):
+            return size
+        crc = crc16(packet + payload)
+        if self.corrupt_rate and self.random.random() < self.corrupt_rate:
+            crc ^= 0x0001
+            self.corrupted += 1
+        self._respond(packet, payload + struct.pack('>H', crc))
+        return size
+
+    def _lost(self, size):
+        # Whether a request of size bytes lost any of them on the way in
+        if self.drop_rate and any(self.random.random() < self.drop_rate
+                                  for _ in range(size)):
+            self.dropped_packets += 1
+            return True
+        return False
+
+    def _respond(self, request, response):
+        delay = self.latency
+        if self.baud:
+            # From now until the request's last byte is in
+            delay += (self._received + len(request) * 10 / self.baud
+                      - time.perf_counter())
+        if delay > 0:
+            time.sleep(delay)
+        if self.drop_rate:
+            kept = bytes(b for b in response
+                         if self.random.random() >= self.drop_rate)
+            self.dropped_bytes += len(response) - len(kept)
+            response = kept
+        # Long responses go out a few bytes at a time, like the real wire,
+        # so the host's inter-byte timeout sees them arrive
+        for i in range(0, len(response), RESPONSE_CHUNK):
+            chunk = response[i:i + RESPONSE_CHUNK]
+            if self.baud:
+                time.sleep(len(chunk) * 10 / self.baud)
+            os.write(self._master, chunk)
+
+
+def main():
+    sim = RoboclawSimulator()
+    port = sim.start()
+    print(f"Simulated Roboclaws at {', '.join(hex(a) for a in sim.devices)}"
+          f" on {port}")
+    try:
+        while True:
+            time.sleep(1)
+            for address, device in sim.devices.items():
+                print(f"{hex(address)}: M1 {device.m1.speed:8.0f} qpps  "
+                      f"M2 {device.m2.speed:8.0f} qpps")
+    except KeyboardInterrupt:
+        print(f"\n{sim.packets} packets, {sim.crc_errors} CRC errors")
+        sim.stop()
+
+
+if __name__ == "__main__":
+    main()
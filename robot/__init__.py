@@ -0,0 +1,18 @@
+import os
+
+import robotlog
+from latency import LatencyTracer
+from robot.config import ROLES
+from robot.runtime import Robot
+
+
+def run(role):
+    # Runs the teleop runtime for one of the robots in robot.config.ROLES.
+    # ME72_LOG_LEVEL=DEBUG shows every stick event and speed change,
+    # ME72_TRACE=1 writes stick to ACK latency histograms on exit
+    robotlog.setup(os.environ.get('ME72_LOG_LEVEL', 'INFO'))
+    config = ROLES[role]
+    tracer = None
+    if os.environ.get('ME72_TRACE'):
+        tracer = LatencyTracer(config.drive_address)
+    Robot(config, tracer).run()
@@ -0,0 +1,8 @@
+import sys
+
+from robot import ROLES, run
+
+# python -m robot goalie
+if len(sys.argv) != 2 or sys.argv[1] not in ROLES:
+    sys.exit(f"usage: python -m robot {{{','.join(ROLES)}}}")
+run(sys.argv[1])
@@ -0,0 +1,38 @@
+# Button behaviours, bound to controller events in robot.config. Each is
+# called as behaviour(robot, state, slot) on the joystick thread when its
+# axis or button changed in a report. state is the joystick.ControllerState
+# and slot its binding's index into it
+
+
+def shooter_toggle(robot, state, slot):
+    # R2 (ABS_Z) pressed past 200 toggles both shooter motors. It has to
+    # drop below 100 again before the next toggle, and sticks keep working
+    # while it is held
+    robot.log.debug("Trigger: %d", state.values[slot])
+    if robot.shooter_trigger.update(state.values[slot]):
+        robot.sequencer.request_toggle()
+        robot.wake.set()
+        robot.log.info("Shooter %s", "on" if robot.shooter_trigger.on else "off")
+
+
+def intake(robot, state, slot):
+    # L1 press runs the shooter motors backwards for 5 seconds, another
+    # press while they run restarts the 5 seconds
+    if state.went_down(slot):
+        robot.sequencer.request_intake()
+        robot.wake.set()
+
+
+def shoot(robot, state, slot):
+    # R1 press spins the shooter up and fires for 1 second, another press
+    # while firing keeps it firing
+    if state.went_down(slot):
+        robot.sequencer.request_shoot()
+        robot.wake.set()
+
+
+BEHAVIORS = {
+    'shooter_toggle': shooter_toggle,
+    'intake': intake,
+    'shoot': shoot,
+}
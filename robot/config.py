@@ -0,0 +1,48 @@
+from evdev import ecodes
+
+
+class RoleConfig:
+    'Everything that differs between the robots'
+
+    def __init__(self, name, drive_address=0x80, shooter_address=None,
+                 lower_dead_zone=116, upper_dead_zone=134, expo=0.0,
+                 max_output=64, left_invert=False, right_invert=True,
+                 buttons=None, telemetry_rate=None, log_current=False,
+                 port="/dev/ttyS0", baud=38400):
+        self.name = name
+        self.port = port
+        self.baud = baud
+        self.drive_address = drive_address
+        self.shooter_address = shooter_address  # None: no shooter Roboclaw
+        # Stick response, see drive.ResponseCurve. The right stick is
+        # inverted by default because its motor is mounted the other way
+        # round
+        self.lower_dead_zone = lower_dead_zone
+        self.upper_dead_zone = upper_dead_zone
+        self.expo = expo
+        self.max_output = max_output
+        self.left_invert = left_invert
+        self.right_invert = right_invert
+        # (evdev event type, code) -> behaviour name in robot.behaviors
+        self.buttons = buttons or {}
+        # Background telemetry samples per second, None for no sampler
+        self.telemetry_rate = telemetry_rate
+        self.log_current = log_current  # Log the M1 current every second
+
+
+ROLES = {
+    # Drive Roboclaw 0x80 and shooter 0x82 daisy chained on one UART
+    'attacker': RoleConfig(
+        'attacker', shooter_address=0x82,
+        buttons={(ecodes.EV_ABS, ecodes.ABS_Z): 'shooter_toggle'}),
+    'attack2': RoleConfig(
+        'attack2', shooter_address=0x82,
+        buttons={(ecodes.EV_KEY, ecodes.BTN_TL): 'intake',
+                 (ecodes.EV_KEY, ecodes.BTN_TR): 'shoot'}),
+    'defender': RoleConfig(
+        'defender', lower_dead_zone=118, upper_dead_zone=138,
+        telemetry_rate=10.0, log_current=True),
+    'goalie': RoleConfig(
+        'goalie', lower_dead_zone=118, upper_dead_zone=138,
+        telemetry_rate=10.0),
+}
@@ -0,0 +1,252 @@
+import atexit
+import threading
+import time
+
+from evdev import ecodes
+
+import robotlog
+from bus import RoboclawBus, ESTOP, DRIVE, SHOOTER, TELEMETRY
+from drive import ResponseCurve, TankDrive, command_to_duty
+from joystick import (SLOTS, ControllerMailbox, ControllerState,
+                      TriggerToggle, find_ps4_controller, read_batches,
+                      read_events)
+from looptimer import FixedRateLoop
+from matchlog import MatchLog
+from shooter import ShooterSequencer
+from telemetry import TelemetrySampler
+
+from robot.behaviors import BEHAVIORS
+
+# Drive set-points still queued after DRIVE_DEADLINE seconds are dropped
+DRIVE_DEADLINE = 0.1
+# One DutyM1M2 packet per tick instead of separate M1 and M2 packets
+COMBINED_DRIVE = True
+# Resend an unchanged drive command after this many seconds (must be less
+# than the Roboclaw serial timeout)
+DRIVE_KEEPALIVE = 0.5
+DRIVE_PERIOD = 0.02
+# A stick move runs the drive loop early, but no sooner than this after the
+# previous pass, so a fast stick stream sends at most 125 drive packets/s.
+# Tuned with Tests/latency_trace.py at 38400 baud: stick to ACK p50 ~3 ms,
+# p99 ~10 ms (7.3 and 22 ms with a full period between passes)
+DRIVE_MIN_INTERVAL = 0.008
+
+# Joystick axis mappings
+AXIS_CODES = {'LEFT_Y': ecodes.ABS_Y, 'RIGHT_Y': ecodes.ABS_RY}
+
+
+class Robot:
+    'Teleop runtime for one role: bus, drive loop, sticks and buttons'
+
+    def __init__(self, config, tracer=None):
+        self.config = config
+        # Optional latency.LatencyTracer, follows stick events to the ACK
+        self.tracer = tracer
+        self.log = robotlog.get_logger(config.name)
+        addresses = [config.drive_address]
+        if config.shooter_address is not None:
+            addresses.append(config.shooter_address)
+
+        # Every Roboclaw is daisy chained on one UART, the bus owns the
+        # port. With a shooter, the drive loop queues the shooter set-points
+        # and the drive set-point in one bus.batch(), so they go out
+        # pipelined
+        self.bus = RoboclawBus(config.port, config.baud,
+                               pipeline=len(addresses))
+        self.roboclaw = self.bus.handle(config.drive_address, DRIVE,
+                                        deadline=DRIVE_DEADLINE)
+        # Stops jump the queue ahead of drive and shooter commands
+        self.estops = [self.bus.handle(address, ESTOP) for address in addresses]
+        # Timed shooter sequences (attack2's L1/R1) run on the drive loop,
+        # the buttons only queue a request
+        self.sequencer = None
+        if config.shooter_address is not None:
+            # Queues its set-points without waiting (see send_motor_command)
+            # and sends a stop again until it is ACKed
+            self.sequencer = ShooterSequencer(self.bus.handle(
+                config.shooter_address, SHOOTER, wait=False))
+        # R2 edge detection for the attacker's shooter_toggle
+        self.shooter_trigger = TriggerToggle()
+        self.sampler = None
+        if config.telemetry_rate:
+            # Health reads run in the background, the loops only look at
+            # the latest sample
+            self.sampler = TelemetrySampler(
+                self.bus.handle(config.drive_address, TELEMETRY),
+                rate=config.telemetry_rate)
+
+        self.drive = TankDrive(self.roboclaw, combined=COMBINED_DRIVE,
+                               keepalive=DRIVE_KEEPALIVE)
+        self.left_curve = ResponseCurve(
+            config.lower_dead_zone, config.upper_dead_zone, config.expo,
+            config.max_output, invert=config.left_invert)
+        self.right_curve = ResponseCurve(
+            config.lower_dead_zone, config.upper_dead_zone, config.expo,
+            config.max_output, invert=config.right_invert)
+        self.match_log = None
+        self.controller = None
+
+        # Every axis and button, written only by the joystick thread. The
+        # drive loop reads a consistent copy without taking a lock
+        self.controls = ControllerMailbox()
+        # The joystick thread's own view, with edge flags per report
+        self.state = ControllerState(self.controls)
+        self.left_slot = SLOTS[(ecodes.EV_ABS, AXIS_CODES['LEFT_Y'])]
+        self.right_slot = SLOTS[(ecodes.EV_ABS, AXIS_CODES['RIGHT_Y'])]
+        self.stick_mask = 1 << self.left_slot | 1 << self.right_slot
+        # Set by poll_joystick when a stick value changes or a shooter
+        # button is pressed, wakes send_motor_command
+        self.wake = threading.Event()
+        # Drive tick on fixed deadlines, a stick move runs it early
+        self.drive_loop = FixedRateLoop(DRIVE_PERIOD, wake=self.wake,
+                                        min_interval=DRIVE_MIN_INTERVAL)
+        # (slot, behaviour), and the slots that have any
+        self.buttons = [(SLOTS[key], BEHAVIORS[name])
+                        for key, name in config.buttons.items()]
+        self.button_mask = 0
+        for slot, behavior in self.buttons:
+            self.button_mask |= 1 << slot
+        if tracer is not None:
+            self.bus.roboclaw.ack_hook = tracer.ack
+
+    def stop_motors(self):
+        self.log.info("Stopping motors...")
+        for estop in self.estops:
+            estop.ForwardM1(0)
+            estop.ForwardM2(0)
+
+    def send_motor_command(self):
+        # M1 is RIGHT
+        # M2 is LEFT
+        left_table = self.left_curve.table
+        right_table = self.right_curve.table
+        left_slot = self.left_slot
+        right_slot = self.right_slot
+        tracer = self.tracer
+        last_left_command = 0
+        last_right_command = 0
+        last_generation = None
+
+        while True:
+            try:
+                generation, controls = self.controls.read()
+                trace = tracer.pickup() if tracer else None
+                if generation != last_generation:
+                    # Only look the commands up again when the controller
+                    # changed since the last tick
+                    last_generation = generation
+                    speed_L = controls[left_slot]
+                    speed_R = controls[right_slot]
+                    # Motor 1 - Left Joystick Control, Motor 2 - Right Joystick Control
+                    left_command = left_table[speed_L]
+                    right_command = right_table[speed_R]
+                sent = self.drive.packets_sent
+                with self.drive_loop.io(), self.bus.batch():
+                    # Shooter set-points are only queued, the drive call
+                    # releases them with its own set-point
+                    if self.sequencer is not None:
+                        self.sequencer.update()
+                    self.drive.update(left_command, right_command)
+                if trace is not None:
+                    tracer.finish(trace, self.drive.packets_sent != sent)
+                self.match_log.write(
+                    speed_L, speed_R, command_to_duty(left_command),
+                    command_to_duty(right_command),
+                    self.sampler.latest() if self.sampler else None)
+                if left_command != last_left_command:
+                    self.log.debug("Sent Speed to Motor 1: %d", left_command)
+                    last_left_command = left_command
+                if right_command != last_right_command:
+                    self.log.debug("Sent Speed to Motor 2: %d", right_command)
+                    last_right_command = right_command
+
+            except Exception as e:
+                self.log.warning("Error sending motor command: %s", e)
+
+            # Wake when the stick moves (at most once per DRIVE_MIN_INTERVAL),
+            # otherwise tick every 20ms
+            self.drive_loop.wait()
+
+    def poll_joystick(self, events, controller=None):
+        # events is read_events(controller), which blocks until the
+        # controller has events, or a replay from inputlog.replay. With the
+        # controller, its state is read back after the kernel drops events
+        for batch in read_batches(events, controller):
+            self.handle_batch(batch)
+
+    def handle_batch(self, batch):
+        # One controller report, from the controller or a replayed stream
+        state = self.state
+        changed = state.update(batch)
+        if changed & self.stick_mask:
+            self.wake.set()
+            if self.tracer is not None:
+                self.tracer.stored(state.time)
+            self.log.debug("Joystick Left Y: %d, Right Y: %d",
+                           state.values[self.left_slot],
+                           state.values[self.right_slot])
+        if changed & self.button_mask:
+            for slot, behavior in self.buttons:
+                if state.moved(slot):
+                    try:
+                        behavior(self, state, slot)
+                    except Exception as e:
+                        self.log.warning("Button %s failed: %s",
+                                         behavior.__name__, e)
+
+    def run(self):
+        log = self.log
+        if not self.bus.open():
+            raise RuntimeError(f"Could not open {self.config.port}")
+        # Every drive tick is appended here, read it back with
+        # matchlog.read_log
+        self.match_log = MatchLog(time.strftime(
+            f"logs/{self.config.name}-%Y%m%d-%H%M%S.bin"))
+        atexit.register(self.match_log.close)
+        # Register the stop_motors function to run on exit
+        atexit.register(self.stop_motors)
+
+        self.controller = controller = find_ps4_controller()
+        controller.grab()
+        log.info("Connected to %s at %s", controller.name, controller.path)
+
+        self.roboclaw.SetM1DefaultAccel(8)  # Smooth acceleration for M1
+        self.roboclaw.SetM2DefaultAccel(8)  # Smooth acceleration for M2
+
+        # Starting speed Zero
+        self.roboclaw.ForwardM1(0)
+        self.roboclaw.ForwardM2(0)
+        log.info("Motors initialized to 0 speed")
+
+        threading.Thread(target=self.poll_joystick, daemon=True,
+                         args=(read_events(controller), controller)).start()
+        threading.Thread(target=self.send_motor_command, daemon=True).start()
+        if self.sampler is not None:
+            self.sampler.start()
+
+        try:
+            last_error = None
+            while True:
+                time.sleep(1)  # Keep the main thread alive
+                if self.sampler is None:
+                    continue
+                error_status = self.sampler.error()
+                if error_status != last_error:
+                    log.info("Error Status: %s", error_status)
+                    last_error = error_status
+                sample = self.sampler.latest()
+                if self.config.log_current and sample is not None:
+                    log.info("Motor 1 Current: %.2f A", sample.current1)
+        except KeyboardInterrupt:
+            log.info("Exiting...")
+            log.info("Drive packets sent: %d, saved: %d",
+                     self.drive.packets_sent, self.drive.packets_saved)
+            log.info("Bus stats: %s", self.bus.stats())
+            log.info("Link stats: %s", self.bus.link_stats())
+            log.info("Drive loop: %s", self.drive_loop.stats())
+            if self.tracer is not None:
+                path = time.strftime(
+                    f"logs/{self.config.name}-latency-%Y%m%d-%H%M%S.json")
+                self.tracer.export(path)
+                log.info("Stick to ACK latency written to %s", path)
+            self.stop_motors()  # Ensure motors stop before exiting
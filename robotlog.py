@@ -0,0 +1,72 @@
+import atexit
+import logging
+import logging.handlers
+import queue
+
+# Loggers used by the robot code all live under this one
+ROOT = 'me72'
+
+
+class RateLimitFilter(logging.Filter):
+    'Drops a message repeated within interval seconds and counts the drops'
+
+    def __init__(self, interval=0.5):
+        super().__init__()
+        self.interval = interval
+        self._last = {}  # (logger, unformatted message) -> [time, dropped]
+
+    def filter(self, record):
+        key = (record.name, record.msg)
+        state = self._last.get(key)
+        if state is not None and record.created - state[0] < self.interval:
+            state[1] += 1
+            return False
+        record.suppressed = state[1] if state is not None else 0
+        self._last[key] = [record.created, 0]
+        return True
+
+
+class KeyValueFormatter(logging.Formatter):
+    'Seconds since start, level, logger, message, then any key=value fields'
+
+    def format(self, record):
+        line = (f"{record.relativeCreated / 1000:9.3f} {record.levelname:<7} "
+                f"{record.name}: {record.getMessage()}")
+        # log.debug("stick", extra={'fields': {'axis': 'LEFT_Y', 'value': 12}})
+        fields = getattr(record, 'fields', None)
+        if fields:
+            line += ' ' + ' '.join(f"{key}={value}" for key, value in fields.items())
+        if getattr(record, 'suppressed', 0):
+            line += f" ({record.suppressed} repeats dropped)"
+        if record.exc_info:
+            line += '\n' + self.formatException(record.exc_info)
+        return line
+
+
+def setup(level=logging.INFO, rate_limit=0.5, stream=None):
+    # Messages below level cost one isEnabledFor() check. The rest are
+    # rate limited and queued by the calling thread, and a listener thread
+    # does the slow write to stream (stderr by default), so a stalled SSH
+    # terminal never blocks a control loop. Returns the listener
+    records = queue.SimpleQueue()
+    handler = logging.handlers.QueueHandler(records)
+    if rate_limit:
+        handler.addFilter(RateLimitFilter(rate_limit))
+    output = logging.StreamHandler(stream)
+    output.setFormatter(KeyValueFormatter())
+    listener = logging.handlers.QueueListener(records, output)
+
+    logger = logging.getLogger(ROOT)
+    logger.setLevel(level)
+    for old in list(logger.handlers):
+        logger.removeHandler(old)
+    logger.addHandler(handler)
+    logger.propagate = False
+    listener.start()
+    # Registered first so it runs last and the exit messages get written
+    atexit.register(listener.stop)
+    return listener
+
+
+def get_logger(name):
+    return logging.getLogger(f"{ROOT}.{name}")
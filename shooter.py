@@ -0,0 +1,154 @@
+import collections
+import time
+
+# Shooter states. The motors run backwards slowly for INTAKE, forwards at
+# shoot speed for SPIN_UP and FIRE, and are stopped in COOLDOWN and IDLE.
+# A toggle (the attacker's R2) holds FIRE with no deadline until the next
+# toggle
+IDLE = 'idle'
+INTAKE = 'intake'
+SPIN_UP = 'spin-up'
+FIRE = 'fire'
+COOLDOWN = 'cooldown'
+TOGGLE = 'toggle'  # Request only, never a state
+
+
+class ShooterSequencer:
+    'Runs the shooter from button presses with one state and one deadline'
+
+    def __init__(self, shooter, intake_speed=16, intake_time=5.0,
+                 shoot_speed=63, spin_up=0.25, fire=0.75, cooldown=0.25,
+                 toggle_speed=64):
+        # shooter is the shooter Roboclaw's bus handle. A shot is spin_up +
+        # fire seconds at shoot_speed, the 1 second R1 used to give
+        self.shooter = shooter
+        self.intake_speed = intake_speed
+        self.intake_time = intake_time
+        self.shoot_speed = shoot_speed
+        self.spin_up = spin_up
+        self.fire = fire
+        self.cooldown = cooldown
+        self.toggle_speed = toggle_speed
+        self.state = IDLE
+        self.deadline = None  # When the current state ends, None for never
+        self.pending = None  # Request held back until COOLDOWN ends
+        self.extended = 0  # Presses that pushed an active deadline back
+        self.transitions = 0
+        # Results of the last stop, resent until both motors ACK it
+        self.stops = None
+        self.resent = 0
+        # Presses from the joystick thread. deque append and popleft are
+        # atomic, so only update() ever touches the state
+        self._requests = collections.deque()
+
+    # Called from any thread, never block
+    def request_intake(self):
+        self._requests.append(INTAKE)
+
+    def request_shoot(self):
+        self._requests.append(SPIN_UP)
+
+    def request_toggle(self):
+        self._requests.append(TOGGLE)
+
+    def update(self, now=None):
+        # Called every pass of the drive loop. Applies the queued presses,
+        # then moves on from any state whose deadline has passed. Returns
+        # 1 if a motor command was sent
+        if now is None:
+            now = time.monotonic()
+        sent = 0
+        while self._requests:
+            sent |= self._press(self._requests.popleft(), now)
+        while self.deadline is not None and now >= self.deadline:
+            sent |= self._expire(self.deadline)
+        if self.stops is not None:
+            results = [_result(stop) for stop in self.stops]
+            if False in results:
+                # A lost stop would leave the flywheels running
+                self.resent += 1
+                sent |= self._drive(0)
+            elif None not in results:
+                self.stops = None
+        return sent
+
+    def _press(self, request, now):
+        if request == TOGGLE:
+            if self.state in (SPIN_UP, FIRE):
+                self.pending = None
+                return self._enter(COOLDOWN, now + self.cooldown, 0)
+            if self.state == INTAKE:
+                # Let the flywheels stop before reversing them
+                self.pending = TOGGLE
+                return self._enter(COOLDOWN, now + self.cooldown, 0)
+            if self.state == COOLDOWN:
+                # Fire once stopped, a second toggle takes that back
+                self.pending = None if self.pending == TOGGLE else TOGGLE
+                return 0
+            self.pending = None
+            return self._enter(FIRE, None, self.toggle_speed)
+        if request == INTAKE:
+            if self.state == INTAKE:
+                # Still running, just restart the countdown
+                self.deadline = now + self.intake_time
+                self.extended += 1
+                return 0
+            if self.state in (SPIN_UP, FIRE):
+                # Let the flywheels stop before reversing them
+                self.pending = INTAKE
+                return self._enter(COOLDOWN, now + self.cooldown, 0)
+            if self.state == COOLDOWN:
+                self.pending = INTAKE
+                return 0
+            return self._enter(INTAKE, now + self.intake_time,
+                               -self.intake_speed)
+        if self.state == SPIN_UP:
+            return 0  # Already on its way to FIRE
+        if self.state == FIRE:
+            self.deadline = now + self.fire
+            self.extended += 1
+            return 0
+        if self.state == COOLDOWN:
+            self.pending = SPIN_UP
+            return 0
+        return self._enter(SPIN_UP, now + self.spin_up, self.shoot_speed)
+
+    def _expire(self, now):
+        # now is the deadline that passed, so a late update() doesn't
+        # stretch the states that follow
+        if self.state == SPIN_UP:
+            return self._enter(FIRE, now + self.fire, None)
+        if self.state == FIRE:
+            return self._enter(COOLDOWN, now + self.cooldown, 0)
+        if self.state == COOLDOWN and self.pending is not None:
+            request, self.pending = self.pending, None
+            self._enter(IDLE, None, None)
+            return self._press(request, now)
+        # The motors are already stopped after COOLDOWN
+        return self._enter(IDLE, None, 0 if self.state == INTAKE else None)
+
+    def _enter(self, state, deadline, speed):
+        # speed: signed duty for both motors, None to leave them running
+        self.state = state
+        self.deadline = deadline
+        self.transitions += 1
+        if speed is None:
+            return 0
+        return self._drive(speed)
+
+    def _drive(self, speed):
+        if speed >= 0:
+            results = [self.shooter.ForwardM1(speed),
+                       self.shooter.ForwardM2(speed)]
+        else:
+            results = [self.shooter.BackwardM1(-speed),
+                       self.shooter.BackwardM2(-speed)]
+        self.stops = results if speed == 0 else None
+        return 1
+
+
+def _result(result):
+    # A command's result: True/False, or a bus request still in flight
+    # (RoboclawBus.call with wait=False), None until it finishes
+    poll = getattr(result, 'poll', None)
+    return result if poll is None else poll()
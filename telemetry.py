@@ -0,0 +1,132 @@
+import array
+import collections
+import math
+import threading
+import time
+
+import robotlog
+
+# One ring buffer row per sample, in SI units, NaN where a read failed
+FIELDS = ('time', 'current1', 'current2', 'main_battery', 'logic_battery',
+          'temperature', 'temperature2', 'speed1', 'speed2', 'error',
+          'duration')
+Sample = collections.namedtuple('Sample', FIELDS)
+
+NAN = float('nan')
+
+log = robotlog.get_logger('telemetry')
+
+
+class TelemetrySampler:
+    'Reads Roboclaw health on a background thread into a ring buffer'
+
+    def __init__(self, roboclaw, rate=10.0, capacity=600):
+        # roboclaw is normally a TELEMETRY priority bus handle, so each read
+        # runs only when no drive or shooter command is waiting
+        self.roboclaw = roboclaw
+        self.period = 1.0 / rate
+        self.capacity = capacity
+        self.samples = 0  # Rows written, the newest is samples - 1
+        self.failures = 0  # Samples with at least one failed read
+        self._data = array.array('d', [NAN]) * (capacity * len(FIELDS))
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    # Queries never wait for the port or the sampler thread. There is one
+    # writer and it fills a row before counting it, so a reader only sees
+    # complete rows
+    def latest(self):
+        # Newest Sample, None before the first one
+        if not self.samples:
+            return None
+        return Sample(*self._row(self.samples - 1))
+
+    def history(self, field, count=None):
+        # The last count values of one field, oldest first
+        column = FIELDS.index(field)
+        end = self.samples
+        start = max(0, end - self.capacity)
+        if count is not None:
+            start = max(start, end - count)
+        width = len(FIELDS)
+        data = self._data
+        return [data[(i % self.capacity) * width + column]
+                for i in range(start, end)]
+
+    def error(self):
+        # Latest error flags as an int, None if unknown
+        sample = self.latest()
+        if sample is None or math.isnan(sample.error):
+            return None
+        return int(sample.error)
+
+    def _row(self, index):
+        width = len(FIELDS)
+        start = (index % self.capacity) * width
+        return self._data[start:start + width]
+
+    def _sample(self):
+        # Each read is its own bus request, so a drive or shooter command
+        # queued meanwhile waits for one read, not the whole burst.
+        # duration covers the burst including those waits
+        roboclaw = self.roboclaw
+        start = time.monotonic()
+        reads = (roboclaw.ReadCurrents(), roboclaw.ReadMainBatteryVoltage(),
+                 roboclaw.ReadLogicBatteryVoltage(), roboclaw.ReadTemp(),
+                 roboclaw.ReadTemp2(), roboclaw.ReadSpeedM1(),
+                 roboclaw.ReadSpeedM2(), roboclaw.ReadError())
+        (currents, battery, logic, temperature, temperature2, speed1, speed2,
+         error) = reads
+        row = array.array('d', (
+            start,
+            _field(currents, 1, 100.0),
+            _field(currents, 2, 100.0),
+            _field(battery, 1, 10.0),
+            _field(logic, 1, 10.0),
+            _field(temperature, 1, 10.0),
+            _field(temperature2, 1, 10.0),
+            _field(speed1, 1, 1.0),
+            _field(speed2, 1, 1.0),
+            _field(error, 1, 1.0),
+            time.monotonic() - start,
+        ))
+        if not all(read[0] for read in reads):
+            self.failures += 1
+        return row
+
+    def _run(self):
+        width = len(FIELDS)
+        next_time = time.monotonic()
+        while not self._stop.is_set():
+            try:
+                row = self._sample()
+            except Exception as e:
+                log.warning("Telemetry sample failed: %s", e)
+                row = None
+            if row is not None:
+                start = (self.samples % self.capacity) * width
+                self._data[start:start + width] = row
+                self.samples += 1
+            next_time += self.period
+            delay = next_time - time.monotonic()
+            if delay < 0:
+                next_time = time.monotonic()  # Overran, don't try to catch up
+                delay = 0
+            self._stop.wait(delay)
+
+
+def _field(result, index, divisor):
+    # One value from a Read* result tuple, NaN if the read failed
+    return result[index] / divisor if result[0] else NAN